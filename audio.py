@@ -0,0 +1,76 @@
+from os import path
+from time import perf_counter
+
+import pyglet
+
+from loader import Loader
+from metrics import metrics
+
+
+def decode_sound(file):
+    with metrics.startup(f"decode {path.basename(file)}"):
+        return pyglet.media.load(file, streaming=False)
+
+sounds = Loader(decode_sound)
+
+
+class Audio:
+    """Tick and finish sounds, decoded once and played from a pool.
+
+    Ticks are scheduled for when the pointer actually crosses a boundary
+    rather than once per frame, and at most one per min_interval seconds
+    so fast spins don't turn into noise.
+    """
+
+    def __init__(self, tick_file, finish_file, tick_volume=1.0,
+        finish_volume=1.0, players=4, min_interval=1/30):
+
+        self.tick_sound = sounds.load(tick_file)
+        self.finish_sound = sounds.load(finish_file)
+        self.tick_volume = tick_volume
+        self.finish_volume = finish_volume
+        self.min_interval = min_interval
+
+        # Oldest first, the front player is the one to reuse next
+        self.players = [pyglet.media.Player() for _ in range(max(1, players))]
+        self.finish_player = pyglet.media.Player()
+        self.last_tick = 0.0
+
+    def play(self, player, sound, volume):
+        player.volume = volume
+        if player.source:
+            # Still holding the sound, rewind rather than queue it again
+            player.seek(0.0)
+        else:
+            player.queue(sound)
+        player.play()
+
+    def tick(self, dt=0.0):
+        # Reuse an idle player, or cut off the one that started first
+        player = next((p for p in self.players if not p.playing),
+            self.players[0])
+        self.players.remove(player)
+        self.players.append(player)
+        self.play(player, self.tick_sound, self.tick_volume)
+
+    def schedule_ticks(self, times):
+        """Schedule a tick for each crossing, given in seconds from now."""
+        now = perf_counter()
+        for delay in times:
+            if now + delay - self.last_tick < self.min_interval:
+                continue
+            self.last_tick = now + delay
+
+            if delay <= 0:
+                self.tick()
+            else:
+                pyglet.clock.schedule_once(self.tick, delay)
+
+    def finish(self):
+        self.play(self.finish_player, self.finish_sound, self.finish_volume)
+
+    def delete(self):
+        # Ticks still scheduled would play through the deleted players
+        pyglet.clock.unschedule(self.tick)
+        for player in self.players + [self.finish_player]:
+            player.delete()
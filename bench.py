@@ -0,0 +1,260 @@
+"""Headless benchmarks for importing, spinning and moving.
+
+Runs against an in-process stand-in for the Google Sheet so results only
+depend on the code and the simulated latency, e.g.
+
+    python bench.py --rows 10 1000 10000 --latency 0.05 --json before.json
+"""
+import argparse
+import json
+import random
+import re
+import tempfile
+import time
+from itertools import product
+
+import pyglet
+
+from model import WheelModel
+from sources import col_to_int, col_to_str
+from spin import Spin
+
+
+class FakeWorksheet:
+    """Just enough of gspread.Worksheet for sorcle, with simulated latency."""
+
+    def __init__(self, title, rows, latency=0.0, sheet_id=0):
+        self.title = title
+        self.id = sheet_id
+        self.rows = rows
+        self.latency = latency
+        self.calls = 0
+
+    def request(self):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def read(self, a1):
+        # "B3:E1001" -> rows[columns[]], trimmed like the Sheets API
+        left, top, right, bottom = re.fullmatch(
+            r"([A-Z]+)(\d+):([A-Z]+)(\d+)", a1).groups()
+        left, right = col_to_int(left) - 1, col_to_int(right)
+
+        values = []
+        for row in self.rows[int(top) - 1:int(bottom)]:
+            row = row[left:right]
+            while row and row[-1] == "":
+                row = row[:-1]
+            values.append(row)
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def get(self, a1):
+        self.request()
+        return self.read(a1)
+
+    def batch_get(self, ranges):
+        self.request()
+        return [self.read(a1) for a1 in ranges]
+
+    def append_rows(self, values, table_range=None, value_input_option=None):
+        self.request()
+        self.rows.extend(values)
+
+
+class FakeSpreadsheet:
+
+    def __init__(self, worksheets, latency=0.0):
+        self.worksheets = {w.title: w for w in worksheets}
+        self.latency = latency
+        self.calls = 0
+
+    def worksheet(self, title):
+        self.calls += 1
+        return self.worksheets[title]
+
+    def get_lastUpdateTime(self):
+        self.calls += 1
+        return str(time.time())
+
+    def batch_update(self, body):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        by_id = {w.id: w for w in self.worksheets.values()}
+        for request in body["requests"]:
+            r = request["deleteDimension"]["range"]
+            del by_id[r["sheetId"]].rows[r["startIndex"]:r["endIndex"]]
+
+
+def make_rows(count, dupe_ratio, extras):
+    # Column A is the key, B the name, C the sub, then the extras
+    pool = [f"Dupe {i}" for i in range(max(1, count // 10))]
+    rows = []
+    for i in range(count):
+        if random.random() < dupe_ratio:
+            name = random.choice(pool)
+        else:
+            name = f"Entry {i}"
+        rows.append([str(i), name, f"Sub {i % 7}"]
+            + [f"Extra {e}/{i}" for e in range(extras)])
+    return rows
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    def rank(p):
+        return samples[min(len(samples) - 1, int(p / 100 * len(samples)))]
+    return {"p50": rank(50) * 1000, "p99": rank(99) * 1000, "n": len(samples)}
+
+
+def configure(settings, rows, combine, interleave, extras):
+    c = settings["spreadsheet"]
+    c["first_column"] = "A"
+    c["last_column"] = col_to_str(3 + extras)
+    c["key_column"] = "B"
+    c["primary_column"] = "B"
+    c["sub_column"] = "C"
+    c["extra_columns"] = [col_to_str(4 + e) for e in range(extras)]
+    c["start_row"] = 1
+    c["max_rows"] = rows
+
+    settings["wheel"]["remove_dupes"] = False
+    settings["wheel"]["combine_dupes"] = combine
+    settings["wheel"]["interleave"] = interleave
+    settings["wheel"]["decel_change"] = False
+    settings["move"]["cut_max"] = False
+
+
+def bench_case(window, args, rows, dupes, combine, interleave, extras):
+    configure(window.settings, rows, combine, interleave, extras)
+    data = make_rows(rows, dupes, extras)
+
+    source = window.source
+    queue = FakeWorksheet(source.s_config["sheet"], [r[:] for r in data],
+        args.latency, sheet_id=1)
+    history = FakeWorksheet(source.s_move["sheet"], [], args.latency,
+        sheet_id=2)
+    source.spreadsheet = FakeSpreadsheet([queue, history], args.latency)
+    source.sheet = queue
+    source.move_sheet = None
+
+    results = {"import": [], "build": [], "rebuild": [], "labels": [],
+        "frame": [], "move": []}
+
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        model = source.read_spreadsheet()
+        results["import"].append(time.perf_counter() - start)
+
+    # Cold build from an empty wheel, then the diffing path on the same rows
+    for _ in range(args.repeat):
+        window.wheel.import_spreadsheet(WheelModel())
+        start = time.perf_counter()
+        window.wheel.import_spreadsheet(model)
+        results["build"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        window.wheel.import_spreadsheet(model)
+        results["rebuild"].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    while window.wheel.unlabelled:
+        window.wheel.build_labels(window.s_wheel["labels_per_tick"])
+    results["labels"].append(time.perf_counter() - start)
+
+    # Constant speed so the spin never ends mid-measurement
+    window.start_spin(Spin([args.speed] * (args.frames + 1)))
+    for _ in range(args.frames):
+        start = time.perf_counter()
+        window.update(window.tick)
+        pyglet.gl.glFinish()
+        results["frame"].append(time.perf_counter() - start)
+    window.wheel.spinning = False
+
+    calls = []
+    for _ in range(args.repeat):
+        queue.rows = [r[:] for r in data]
+        queue.calls = history.calls = source.spreadsheet.calls = 0
+        winner = random.choice(window.wheel.wedges)
+
+        start = time.perf_counter()
+        window.move_winners([winner], "bench").result()
+        results["move"].append(time.perf_counter() - start)
+        calls.append(queue.calls + history.calls + source.spreadsheet.calls)
+
+    report = {k: percentiles(v) for k, v in results.items()}
+    report["move"]["requests"] = max(calls)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+",
+        default=[10, 100, 1000, 10000])
+    parser.add_argument("--dupes", type=float, nargs="+", default=[0.0, 0.5],
+        help="fraction of rows sharing a name with another row")
+    parser.add_argument("--combine", type=int, nargs="+", default=[0, 1])
+    parser.add_argument("--interleave", type=int, nargs="+", default=[0])
+    parser.add_argument("--extras", type=int, nargs="+", default=[0, 3])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--speed", type=float, default=50.0,
+        help="degrees per tick while measuring spin frames")
+    parser.add_argument("--latency", type=float, default=0.0,
+        help="seconds added to every simulated Sheets request")
+    parser.add_argument("--headless", action="store_true",
+        help="render through EGL without a display")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    pyglet.options["headless"] = args.headless
+    import sorcle
+    from scheduler import Scheduler
+
+    random.seed(args.seed)
+
+    # Don't let quotas skew results, or the move journal, snapshot and
+    # output files leak into the real wheel's folder
+    sorcle.scheduler = Scheduler(read_per_minute=10**9,
+        write_per_minute=10**9, retries=0)
+    settings = sorcle.wheel_settings(sorcle.settings)[0]
+    settings["dir"] = tempfile.mkdtemp()
+    # Keep the spin results out of the table
+    settings["wheel"]["spin_log"] = ""
+
+    # No vsync, and draw straight away rather than through the app loop
+    window = sorcle.Sorcle(pyglet.gl.Config(), settings, visible=False,
+        vsync=False)
+    pyglet.window.Window._enable_event_queue = False
+    window.idle_mode = "full"
+    window.control.stop()
+
+    cases = []
+    print(f"{'case':<56}{'metric':<9}{'p50 ms':>10}{'p99 ms':>10}")
+    for rows, dupes, combine, interleave, extras in product(args.rows,
+        args.dupes, args.combine, args.interleave, args.extras):
+
+        name = (f"rows={rows} dupes={dupes} combine={combine} "
+            f"interleave={interleave} extras={extras}")
+        report = bench_case(window, args, rows, dupes,
+            bool(combine), bool(interleave), extras)
+        cases.append({"rows": rows, "dupes": dupes, "combine": combine,
+            "interleave": interleave, "extras": extras, "results": report})
+
+        for metric, r in report.items():
+            print(f"{name:<56}{metric:<9}{r['p50']:>10.3f}{r['p99']:>10.3f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "cases": cases}, f, indent=1)
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from os import path
+from queue import Queue, Empty
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# watchdog gives us inotify/ReadDirectoryChangesW, otherwise poll on a thread
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+TRIGGERS = ("spin", "import", "move", "draw")
+
+
+class Control:
+    """Collects spin/import/move/draw commands off the render loop.
+
+    Trigger files dropped in the working directory (the .bat workflow) and
+    requests to the optional local HTTP endpoint both end up in one queue
+    the window drains when it's ready for them.
+    """
+
+    def __init__(self, w_dir, poll_interval=0.1, http_port=0):
+        self.w_dir = w_dir
+        self.poll_interval = poll_interval
+        self.http_port = http_port
+
+        self.queue = Queue()
+        self.lock = threading.Lock()
+        self.running = False
+
+        self.observer = None
+        self.poll_thread = None
+        self.server = None
+
+    def start(self):
+        self.running = True
+
+        if Observer:
+            self.observer = Observer()
+            self.observer.schedule(_TriggerHandler(self), self.w_dir)
+            self.observer.daemon = True
+            self.observer.start()
+        else:
+            self.poll_thread = threading.Thread(target=self._poll, daemon=True)
+            self.poll_thread.start()
+
+        if self.http_port:
+            self.server = ThreadingHTTPServer(
+                ("127.0.0.1", self.http_port), _HTTPHandler)
+            self.server.control = self
+            threading.Thread(
+                target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.observer:
+            self.observer.stop()
+        if self.server:
+            self.server.shutdown()
+
+    def put(self, command, text=""):
+        if command not in TRIGGERS:
+            return False
+        self.queue.put((command, text, time.perf_counter()))
+        return True
+
+    def get(self):
+        # Returns (command, text, time queued) or None
+        try:
+            return self.queue.get_nowait()
+        except Empty:
+            return None
+
+    def clear(self):
+        # Drop anything queued while busy to mitigate accidental presses
+        while self.get():
+            pass
+        for name in TRIGGERS:
+            file = path.join(self.w_dir, name)
+            if path.isfile(file):
+                try: os.remove(file)
+                except OSError: pass
+
+    def consume_file(self, name):
+        file = path.join(self.w_dir, name)
+        with self.lock:
+            if not path.isfile(file):
+                return
+            try:
+                with open(file, encoding="utf-8", errors="replace") as f:
+                    text = f.read().strip()
+                os.remove(file)
+            except OSError:
+                return
+        self.put(name, text)
+
+    def _poll(self):
+        while self.running:
+            for name in TRIGGERS:
+                self.consume_file(name)
+            time.sleep(self.poll_interval)
+
+
+class _TriggerHandler(FileSystemEventHandler):
+
+    def __init__(self, control):
+        self.control = control
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in (
+            "created", "modified", "moved", "closed"):
+            return
+
+        name = path.basename(
+            getattr(event, "dest_path", "") or event.src_path)
+        if name in TRIGGERS:
+            # Give `echo x > move` a moment to finish writing
+            time.sleep(0.05)
+            self.control.consume_file(name)
+
+
+class _HTTPHandler(BaseHTTPRequestHandler):
+
+    def handle_command(self, text):
+        command = urlsplit(self.path).path.strip("/")
+        query = parse_qs(urlsplit(self.path).query)
+        if not text and "reason" in query:
+            text = query["reason"][0]
+
+        if self.server.control.put(command, text.strip()):
+            self.send_response(204)
+        else:
+            self.send_response(404)
+        self.end_headers()
+
+    def do_GET(self):
+        self.handle_command("")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.handle_command(
+            self.rfile.read(length).decode("utf-8", errors="replace"))
+
+    def log_message(self, format, *args):
+        pass
@@ -0,0 +1,38 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Images and sounds decode here while windows are being created
+executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="loader")
+
+
+class Loader:
+    """Decodes files in the background, once however many wheels use them.
+
+    preload starts decoding a file and load waits for it. A failed decode
+    isn't kept, the next load tries again.
+    """
+
+    def __init__(self, decode):
+        self.decode = decode
+        self.lock = threading.Lock()
+        self.futures = {}
+
+    def preload(self, file):
+        with self.lock:
+            if file not in self.futures:
+                self.futures[file] = executor.submit(self.decode, file)
+            return self.futures[file]
+
+    def load(self, file):
+        future = self.preload(file)
+        try:
+            return future.result()
+        except Exception:
+            with self.lock:
+                if self.futures.get(file) is future:
+                    del self.futures[file]
+            raise
+
+    def clear(self):
+        with self.lock:
+            self.futures.clear()
@@ -0,0 +1,165 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from output import write_atomic
+
+
+class Histogram:
+    """Keeps running totals plus a window of recent samples for quantiles."""
+
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class Metrics:
+    """Timings and counters shared by the render loop and worker threads."""
+
+    quantiles = (0.5, 0.9, 0.99)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.phases = []
+
+    def observe(self, name, seconds):
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def phase(self, name, start, end=None):
+        # One-off steps like loading an image, see --profile-startup
+        end = time.perf_counter() if end is None else end
+        with self.lock:
+            self.phases.append((name, threading.current_thread().name, start,
+                end - start))
+
+    @contextmanager
+    def startup(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase(name, start)
+
+    @contextmanager
+    def request(self, call):
+        # Sheets calls get counted as well as timed, failures separately
+        self.count(f"sheets_requests.{call}")
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.count(f"sheets_errors.{call}")
+            raise
+        finally:
+            self.observe(f"sheets.{call}", time.perf_counter() - start)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "time": time.time(),
+                "histograms": {name: {"count": h.count, "sum": h.sum,
+                    **{str(q): h.quantile(q) for q in self.quantiles}}
+                    for name, h in self.histograms.items()},
+                "counters": dict(self.counters)}
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+
+        # Group by metric so each gets a single TYPE line
+        series = {}
+        for name, h in sorted(snapshot["histograms"].items()):
+            metric, label = prometheus_name(name, "_seconds")
+            lines = series.setdefault((metric, "summary"), [])
+            for q in self.quantiles:
+                lines.append(f"{metric}{prometheus_labels(label, q)} {h[str(q)]:.6f}")
+            lines.append(f"{metric}_sum{prometheus_labels(label)} {h['sum']:.6f}")
+            lines.append(f"{metric}_count{prometheus_labels(label)} {h['count']}")
+        for name, value in sorted(snapshot["counters"].items()):
+            metric, label = prometheus_name(name, "_total")
+            lines = series.setdefault((metric, "counter"), [])
+            lines.append(f"{metric}{prometheus_labels(label)} {value}")
+
+        text = []
+        for (metric, kind), lines in series.items():
+            text.append(f"# TYPE {metric} {kind}")
+            text.extend(lines)
+        return "\n".join(text) + "\n"
+
+    def write(self, file, format="json"):
+        if format == "prometheus":
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.snapshot(), indent=1)
+
+        write_atomic(file, text)
+
+    def startup_report(self, started):
+        # Phases in the order they started, timed from the given start
+        lines = [f"{'phase':<36}{'thread':<14}{'at ms':>9}{'took ms':>9}"]
+        with self.lock:
+            phases = sorted(self.phases, key=lambda p: p[2])
+        for name, thread, start, took in phases:
+            lines.append(f"{name[:35]:<36}{thread[:13]:<14}"
+                f"{(start - started) * 1000:>9.1f}{took * 1000:>9.1f}")
+        return "\n".join(lines)
+
+    def overlay_text(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name in ("frame", "step", "draw"):
+            h = snapshot["histograms"].get(name)
+            if h:
+                lines.append(f"{name}: p50 {h['0.5']*1000:.2f}ms"
+                    f"  p99 {h['0.99']*1000:.2f}ms")
+        requests = sum(v for k, v in snapshot["counters"].items()
+            if k.startswith("sheets_requests."))
+        lines.append(f"sheets requests: {requests}")
+        return "\n".join(lines)
+
+
+def prometheus_name(name, suffix):
+    # "sheets.get" -> ("sorcle_sheets_seconds", "get")
+    base, _, label = name.partition(".")
+    return f"sorcle_{base}{suffix}", label
+
+def prometheus_labels(label, quantile=None):
+    labels = []
+    if label:
+        labels.append(f'name="{label}"')
+    if quantile is not None:
+        labels.append(f'quantile="{quantile}"')
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+metrics = Metrics()
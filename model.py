@@ -0,0 +1,98 @@
+import sys
+from array import array
+
+
+class WheelModel:
+    """Everything on the wheel, stored by column rather than per row.
+
+    Entry i owns rows[row_start[i]:row_start[i+1]], and the same slice of
+    ids and each extras column since every row brings one set of extras
+    and one id, what the source knows that row by when moving it. Its subs
+    are subs[sub_start[i]:sub_start[i+1]], which can be shorter once
+    duplicates are combined. Wedges only keep their entry's index.
+    """
+
+    __slots__ = ("names", "keys", "rows", "row_start", "ids", "subs",
+        "sub_start", "extras")
+
+    def __init__(self, extra_count=0):
+        self.names = []
+        self.keys = []
+        self.rows = array("l")
+        self.row_start = array("l", [0])
+        self.ids = []
+        self.subs = []
+        self.sub_start = array("l", [0])
+        self.extras = [[] for _ in range(extra_count)]
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, key, rows, subs, extras, ids=None):
+        """Append an entry, extras being one list per extras column."""
+        self.names.append(sys.intern(name))
+        self.keys.append(key)
+        self.rows.extend(rows)
+        self.row_start.append(len(self.rows))
+        self.ids.extend(ids if ids is not None else [None] * len(rows))
+        self.subs.extend(subs)
+        self.sub_start.append(len(self.subs))
+        for column, values in zip(self.extras, extras):
+            column.extend(values)
+
+    def name(self, i):
+        return self.names[i]
+
+    def key(self, i):
+        return self.keys[i]
+
+    def weight(self, i):
+        # Rows held, which is how much of the wheel the entry gets
+        return self.row_start[i + 1] - self.row_start[i]
+
+    def get_rows(self, i):
+        return self.rows[self.row_start[i]:self.row_start[i + 1]].tolist()
+
+    def get_ids(self, i):
+        return self.ids[self.row_start[i]:self.row_start[i + 1]]
+
+    def get_subs(self, i):
+        return self.subs[self.sub_start[i]:self.sub_start[i + 1]]
+
+    def get_extras(self, i):
+        # rows[columns[]], like a slice of the sheet
+        start, end = self.row_start[i], self.row_start[i + 1]
+        return [list(row) for row in
+            zip(*(column[start:end] for column in self.extras))]
+
+    def subset(self, indices):
+        """A new model holding just the given entries, in that order."""
+        model = WheelModel(len(self.extras))
+        for i in indices:
+            start, end = self.row_start[i], self.row_start[i + 1]
+            model.add(self.names[i], self.keys[i], self.rows[start:end],
+                self.get_subs(i),
+                [column[start:end] for column in self.extras],
+                self.ids[start:end])
+        return model
+
+    def to_dict(self):
+        return {"names": self.names, "keys": self.keys,
+            "rows": self.rows.tolist(), "row_start": self.row_start.tolist(),
+            "ids": self.ids,
+            "subs": self.subs, "sub_start": self.sub_start.tolist(),
+            "extras": self.extras}
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(len(data["extras"]))
+        model.names = [sys.intern(name) for name in data["names"]]
+        model.keys = data["keys"]
+        model.rows = array("l", data["rows"])
+        model.row_start = array("l", data["row_start"])
+        # Snapshots from before ids were kept
+        model.ids = data.get("ids", [None] * len(model.rows))
+        model.subs = data["subs"]
+        model.sub_start = array("l", data["sub_start"])
+        model.extras = data["extras"]
+        return model
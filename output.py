@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import json
+import os
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from os import path
+
+
+def write_atomic(file, text, check=None):
+    """Write text to a file so readers never see half of it.
+
+    check is called before the new file is swapped in, and nothing is
+    written if it returns False. Returns whether the file was written.
+    """
+    tmp_file = file + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if check and not check():
+        os.remove(tmp_file)
+        return False
+
+    # Windows refuses the rename while another program has the file open
+    for attempt in range(5):
+        try:
+            os.replace(tmp_file, file)
+            return True
+        except PermissionError:
+            if attempt == 4:
+                raise
+            time.sleep(0.02)
+
+
+class Output:
+    """Hands results to every sink on a worker thread.
+
+    Results are a dict with the text for each output file ("winner",
+    "sub" and "extras") and the winners they came from ("winners").
+    """
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def write(self, result):
+        return self.executor.submit(self._write, result)
+
+    def close(self):
+        self.executor.shutdown()
+        for sink in self.sinks:
+            sink.close()
+
+    def _write(self, result):
+        # One broken sink shouldn't stop the rest
+        for sink in self.sinks:
+            try:
+                sink.write(result)
+            except Exception as e:
+                print(f"Couldn't write result to {type(sink).__name__}: {e}")
+
+
+class TextSink:
+    """winner.txt, sub.txt and extraN.txt for OBS text sources."""
+
+    def __init__(self, w_dir):
+        self.w_dir = w_dir
+        self.written = {}
+
+    def write(self, result):
+        files = {"winner.txt": result["winner"], "sub.txt": result["sub"]}
+
+        # Blank any extra files left from a result with more columns
+        for file in glob(path.join(self.w_dir, "extra*.txt")):
+            files[path.basename(file)] = ""
+        for ex_count, text in enumerate(result["extras"], start=1):
+            files[f"extra{ex_count}.txt"] = text
+
+        for name, text in files.items():
+            file = path.join(self.w_dir, name)
+            if self.written.get(file) == text and path.isfile(file):
+                continue
+            write_atomic(file, text)
+            self.written[file] = text
+
+    def close(self):
+        pass
+
+
+class JSONSink:
+    """The whole result in a single JSON file."""
+
+    def __init__(self, file):
+        self.file = file
+        self.written = None
+
+    def write(self, result):
+        text = json.dumps(result, indent=1)
+        if text != self.written:
+            write_atomic(self.file, text)
+            self.written = text
+
+    def close(self):
+        pass
+
+
+class WebSocketSink:
+    """Pushes each result as JSON to browser sources over a local websocket.
+
+    Browsers connecting later are sent the last result straight away.
+    """
+
+    def __init__(self, port):
+        self.lock = threading.Lock()
+        self.clients = []
+        self.last = None
+
+        self.server = _WebSocketServer(("127.0.0.1", port), _WebSocketHandler)
+        self.server.sink = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def write(self, result):
+        message = websocket_frame(json.dumps(result))
+        with self.lock:
+            if message == self.last:
+                return
+            self.last = message
+            for client in self.clients[:]:
+                try:
+                    client.sendall(message)
+                except OSError:
+                    self.clients.remove(client)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            for client in self.clients:
+                client.close()
+
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def websocket_frame(text):
+    # Single unmasked text frame, servers never mask
+    payload = text.encode("utf-8")
+    if len(payload) < 126:
+        header = bytes([0x81, len(payload)])
+    elif len(payload) < 65536:
+        header = bytes([0x81, 126]) + len(payload).to_bytes(2, "big")
+    else:
+        header = bytes([0x81, 127]) + len(payload).to_bytes(8, "big")
+    return header + payload
+
+
+class _WebSocketServer(socketserver.ThreadingTCPServer):
+    # Reopening on the same port after a settings reload
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _WebSocketHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            data = self.request.recv(1024)
+            if not data:
+                return
+            request += data
+
+        headers = {}
+        for line in request.decode("latin-1").split("\r\n")[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "sec-websocket-key" not in headers:
+            self.request.sendall(b"HTTP/1.1 426 Upgrade Required\r\n\r\n")
+            return
+
+        accept = base64.b64encode(hashlib.sha1(
+            (headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest())
+        self.request.sendall(b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+
+        sink = self.server.sink
+        with sink.lock:
+            if sink.last:
+                self.request.sendall(sink.last)
+            sink.clients.append(self.request)
+
+        # Nothing is expected from browsers, hold on until they close
+        try:
+            while True:
+                data = self.request.recv(1024)
+                if not data or data[0] & 0x0f == 0x8:
+                    break
+        except OSError:
+            pass
+
+        with sink.lock:
+            if self.request in sink.clients:
+                sink.clients.remove(self.request)
@@ -0,0 +1,222 @@
+"""Render a spin offscreen to a PNG sequence or an animated GIF/WebP.
+
+Replays a spin from its seed and starting angle in spins.log, or from a
+recorded trace of per-tick velocities, as fast as frames can be drawn
+rather than in real time, e.g.
+
+    python render.py --seed 123456789 --start 211.5 --out replay.webp
+    python render.py --trace spin.json --out frames/ --fps 30
+
+A trace is a JSON list of velocities, or an object holding "velocities"
+and optionally "start". Needs Pillow (pip install pillow).
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil, floor
+from os import path
+
+import pyglet
+from PIL import Image
+
+import bench
+from spin import Spin, plan_spin
+
+
+def to_image(data, size, scale, background=None):
+    # Readback is bottom row first
+    image = Image.frombytes("RGBA", size, data).transpose(
+        Image.Transpose.FLIP_TOP_BOTTOM)
+    if scale != 1:
+        image = image.resize((round(size[0] * scale), round(size[1] * scale)),
+            Image.Resampling.LANCZOS)
+    if background:
+        # GIF transparency is all or nothing, flatten onto the background
+        flat = Image.new("RGBA", image.size, (*background, 255))
+        flat.alpha_composite(image)
+        image = flat.convert("RGB").quantize(256)
+    return image
+
+
+def save_png(data, size, scale, file):
+    to_image(data, size, scale).save(file, compress_level=1)
+
+
+def load_trace(file):
+    with open(file) as f:
+        trace = json.load(f)
+    if isinstance(trace, list):
+        trace = {"velocities": trace}
+    return Spin(trace["velocities"]), trace.get("start")
+
+
+def render(window, offscreen, spin, start, fps, hold):
+    """Yield RGBA bytes for each frame of the spin and the hold after it.
+
+    Physics steps run on a simulated clock at the wheel's tick rate, and
+    frames interpolate between them the same way the live window does.
+    Frames are drawn into offscreen, since what a hidden window's own
+    framebuffer holds is up to the driver.
+    """
+    wheel = window.wheel
+    window.start_spin(spin, start)
+
+    steps = 0
+    for i in range(ceil((len(spin) * window.tick + hold) * fps)):
+        ticks = i / fps / window.tick
+        while steps < floor(ticks):
+            window.step()
+            steps += 1
+        wheel.interpolate(ticks - floor(ticks) if wheel.spinning else 1.0)
+
+        offscreen.bind()
+        window.clear()
+        window.batch.draw()
+        offscreen.resolve()
+        yield offscreen.texture.get_image_data().get_data("RGBA",
+            window.width * 4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int,
+        help="seed of the spin to replay, from spins.log")
+    parser.add_argument("--start", type=float,
+        help="the wheel's starting angle, from spins.log")
+    parser.add_argument("--trace", help="JSON file of per-tick velocities")
+    parser.add_argument("--out", required=True,
+        help="a folder for a PNG sequence, or a .gif or .webp file")
+    parser.add_argument("--fps", type=float,
+        help="frames per second, the wheel's tick rate by default "
+            "(GIF frame times are in hundredths of a second, so use 50)")
+    parser.add_argument("--hold", type=float, default=3.0,
+        help="seconds to keep rendering the winner after the spin stops")
+    parser.add_argument("--scale", type=float, default=1.0,
+        help="resize frames by this much")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+        help="threads encoding frames")
+    parser.add_argument("--sheet", action="store_true",
+        help="read the live queue instead of snapshot.json")
+    parser.add_argument("--rows", type=int,
+        help="render a generated list of this many rows instead")
+    parser.add_argument("--wheel",
+        help="name of the [[wheels]] entry to render, the first by default")
+    parser.add_argument("--headless", action="store_true",
+        help="render through EGL without a display")
+    args = parser.parse_args()
+
+    if (args.seed is None) == (args.trace is None):
+        parser.error("give either --seed or --trace")
+
+    pyglet.options["headless"] = args.headless
+    # Nobody's listening, don't open an audio device for the ticks
+    pyglet.options["audio"] = ("silent",)
+    import sorcle
+
+    wheels = sorcle.wheel_settings(sorcle.settings)
+    settings = next((w for w in wheels if w["name"] == args.wheel), None)
+    if args.wheel and not settings:
+        parser.error(f"no wheel named {args.wheel!r}")
+    settings = settings or wheels[0]
+
+    source = sorcle.make_source(settings)
+    if args.rows:
+        bench.configure(settings, args.rows,
+            settings["wheel"]["combine_dupes"], settings["wheel"]["interleave"],
+            0)
+        source = sorcle.SheetSource(settings)
+        source.sheet = bench.FakeWorksheet(source.s_config["sheet"],
+            bench.make_rows(args.rows, 0.0, 0))
+        model = source.read_spreadsheet()
+    elif args.sheet:
+        model = source.read_spreadsheet()
+    else:
+        snapshot = source.load_snapshot()
+        if not snapshot:
+            parser.error("no snapshot.json to render, use --sheet or --rows")
+        model = snapshot["model"]
+    if not len(model):
+        parser.error("nothing on the wheel to render")
+
+    if args.trace:
+        spin, start = load_trace(args.trace)
+        start = args.start if args.start is not None else start
+    else:
+        s_wheel = settings["wheel"]
+        spin = plan_spin(args.seed, s_wheel["speed_range"],
+            s_wheel["decel_rate"], s_wheel["decel_change"])
+        start = args.start
+
+    # Keep the replay's results, logs and triggers out of the wheel's folder
+    settings["dir"] = tempfile.mkdtemp()
+    settings["wheel"]["spin_log"] = ""
+    settings["output"].update(text_files=False, json_file="",
+        websocket_port=0)
+    settings["control"].update(http_port=0, reload_interval=0)
+    settings["window"]["idle_mode"] = "full"
+
+    # Same colors every time the same spin is rendered, though not the
+    # ones it had live, those are picked at random on each import
+    random.seed(args.seed if args.seed is not None else 0)
+
+    # Nothing's drawn to the window itself, frames keep their alpha channel
+    # and get multisampled offscreen
+    window = sorcle.Sorcle(pyglet.gl.Config(), settings, visible=False,
+        vsync=False)
+    window.control.stop()
+    window.wheel.import_spreadsheet(model)
+    while window.wheel.unlabelled:
+        window.wheel.build_labels(len(window.wheel.wedges))
+
+    fps = args.fps or settings["wheel"]["tick_rate"]
+    size = (window.width, window.height)
+    kind = path.splitext(args.out)[1].lower()
+    if kind not in (".gif", ".webp"):
+        os.makedirs(args.out, exist_ok=True)
+    background = settings["window"]["bg_color"] if kind == ".gif" else None
+
+    # Draw on this thread while the pool encodes, keeping only a few
+    # frames in flight so memory stays flat however long the spin is
+    started = time.perf_counter()
+    images = []
+    pending = deque()
+    offscreen = sorcle.Offscreen(window.width, window.height,
+        settings["window"]["samples"])
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for i, data in enumerate(render(window, offscreen, spin, start, fps,
+            args.hold)):
+
+            if kind in (".gif", ".webp"):
+                future = pool.submit(to_image, data, size, args.scale,
+                    background)
+            else:
+                future = pool.submit(save_png, data, size, args.scale,
+                    path.join(args.out, f"frame{i:05}.png"))
+            pending.append(future)
+
+            while len(pending) > args.workers * 2:
+                images.append(pending.popleft().result())
+        while pending:
+            images.append(pending.popleft().result())
+
+        if kind in (".gif", ".webp"):
+            images[0].save(args.out, save_all=True, append_images=images[1:],
+                duration=round(1000 / fps), loop=0)
+
+    offscreen.delete()
+    elapsed = time.perf_counter() - started
+    duration = len(images) / fps
+    print(f"{len(images)} frames ({duration:.1f}s of spin) in {elapsed:.1f}s, "
+        f"{duration / elapsed:.1f}x real time, winner "
+        f"{window.wheel.selected.name}")
+
+    window.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import json
+import os
+import random
+import threading
+import time
+
+from metrics import metrics
+from output import write_atomic
+
+
+class TokenBucket:
+    """Allows bursts up to capacity, refilling at rate tokens per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity,
+                    self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def quota_bucket(per_minute):
+    # A few seconds' worth of burst, refilled slower to make up for it, so
+    # no minute gets more than the burst plus a minute of refill
+    burst = max(1, per_minute // 12)
+    return TokenBucket(max(per_minute - burst, 1) / 60, burst)
+
+
+class Scheduler:
+    """Rate limits and retries Sheets requests.
+
+    Reads and writes have separate per-minute quotas, so each gets its own
+    bucket. Rate limiting, server errors and dropped connections are retried
+    with exponential backoff, anything else is raised straight away. Retries
+    stop once they'd take a request past timeout seconds.
+    """
+
+    def __init__(self, read_per_minute=60, write_per_minute=60,
+        retries=5, backoff=1.0, timeout=None):
+        self.reads = quota_bucket(read_per_minute)
+        self.writes = quota_bucket(write_per_minute)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+    def read(self, name, func, *args, **kwargs):
+        return self.call(self.reads, name, func, *args, **kwargs)
+
+    def write(self, name, func, *args, **kwargs):
+        return self.call(self.writes, name, func, *args, **kwargs)
+
+    def call(self, bucket, name, func, *args, **kwargs):
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            bucket.acquire()
+            try:
+                with metrics.request(name):
+                    return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.retries or not is_retryable(e):
+                    raise
+
+                # Jitter so retries from a burst don't line up again
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                # Hung requests would otherwise hold up every import and
+                # move queued behind them for several timeouts
+                if (self.timeout
+                    and time.monotonic() - start + delay > self.timeout):
+                    raise
+
+            metrics.count(f"sheets_retries.{name}")
+            attempt += 1
+            time.sleep(delay)
+
+
+def is_retryable(e):
+    # Only needed once something fails, don't slow down startup with them
+    import requests
+    from gspread.exceptions import APIError
+
+    if isinstance(e, APIError):
+        return e.response.status_code in (408, 429, 500, 502, 503, 504)
+    return isinstance(e, (requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout))
+
+
+class Journal:
+    """Pending jobs kept on disk until they're finished.
+
+    Every change is written straight away, so whatever was still in
+    progress when the program stopped can be picked up on the next start.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+        try:
+            with open(file, encoding="utf-8") as f:
+                for job in json.load(f):
+                    self.jobs[job["id"]] = job
+        except (OSError, ValueError):
+            pass
+
+    def pending(self):
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def update(self, job):
+        with self.lock:
+            self.jobs[job["id"]] = dict(job)
+            self.save()
+
+    def remove(self, job):
+        with self.lock:
+            self.jobs.pop(job["id"], None)
+            self.save()
+
+    def save(self):
+        if not self.jobs:
+            if os.path.isfile(self.file):
+                os.remove(self.file)
+            return
+
+        write_atomic(self.file, json.dumps(list(self.jobs.values())))
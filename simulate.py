@@ -0,0 +1,245 @@
+"""Monte Carlo check that the wheel's physics give every wedge fair odds.
+
+Runs millions of spins of the same deceleration model in batches with
+NumPy, no window needed, and compares how often each wedge wins against
+its share of the wheel, e.g.
+
+    python simulate.py --spins 5000000
+    python simulate.py --rows 500 --dupes 0.5 --combine 1 --interleave 1
+
+Needs numpy (pip install numpy).
+"""
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+import pyglet
+
+import bench
+from spin import spin_velocities
+
+# Nothing is drawn, so don't open a hidden window on import
+pyglet.options["shadow_window"] = False
+
+
+def roll(rng, bounds, size):
+    # Same two decimal place rolls as spin.roll, for a whole batch
+    return rng.integers(round(bounds[0] * 100), round(bounds[1] * 100),
+        endpoint=True, size=size) / 100
+
+
+def travel(velocity, decel, rng=None, decel_rate=None, max_ticks=10**6):
+    """Total degrees turned by each spin, stepping every spin at once.
+
+    Deceleration is re-rolled each tick if rng and decel_rate are given.
+    """
+    travelled = np.zeros_like(velocity)
+
+    # Keep only spins still moving, packed so each tick is a few array ops
+    moving = np.arange(len(velocity))
+    velocity = velocity.copy()
+    decel = decel.copy()
+    total = np.zeros_like(velocity)
+    ticks = 0
+    while moving.size and ticks < max_ticks:
+        total += velocity
+
+        # Below this a spin crawls to a stop on the next tick
+        still = velocity >= 0.003
+        if not still.all():
+            travelled[moving[~still]] = total[~still]
+            moving, velocity = moving[still], velocity[still]
+            decel, total = decel[still], total[still]
+
+        if rng is not None:
+            decel = roll(rng, decel_rate, moving.size)
+        velocity -= velocity * (decel / 100)
+        ticks += 1
+
+    travelled[moving] = total
+    return travelled
+
+
+def travel_fixed(velocity, decel, max_ticks=10**6):
+    """Same as travel for a per-spin deceleration, without stepping.
+
+    Speed shrinks geometrically until it drops under 0.003, so the
+    distance is a geometric series.
+    """
+    ratio = 1 - decel / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Ticks spent at or above 0.003, plus the crawling one
+        ticks = np.ceil(np.log(0.003 / velocity) / np.log(ratio))
+        ticks = np.where(velocity < 0.003, 0, ticks)
+        ticks = np.minimum(np.nan_to_num(ticks, nan=max_ticks,
+            posinf=max_ticks, neginf=max_ticks), max_ticks - 1) + 1
+        travelled = velocity * (1 - ratio ** ticks) / (1 - ratio)
+    return np.where(ratio == 1, velocity * ticks, travelled)
+
+
+def simulate(start_angles, spins, speed_range, decel_rate, decel_change,
+    start=None, seed=0, batch=200_000):
+    """Count wins per wedge over the given number of spins.
+
+    Each spin starts from a random angle unless start is given.
+    """
+    rng = np.random.default_rng(seed)
+    start_angles = np.asarray(start_angles)
+    wins = np.zeros(len(start_angles), dtype=np.int64)
+
+    for done in range(0, spins, batch):
+        size = min(batch, spins - done)
+        velocity = roll(rng, speed_range, size)
+        decel = roll(rng, decel_rate, size)
+        if start is None:
+            angle = rng.uniform(0, 360, size)
+        else:
+            angle = np.full(size, start % 360)
+
+        if decel_change:
+            travelled = travel(velocity, decel, rng, decel_rate)
+        else:
+            travelled = travel_fixed(velocity, decel)
+        final = (angle + travelled) % 360
+        wins += np.bincount(
+            np.searchsorted(start_angles, final, side="right") - 1,
+            minlength=len(start_angles))
+
+    return wins
+
+
+def check_physics(samples, speed_range, decel_rate, seed=0):
+    # Largest difference in distance from the per-tick loop the wheel uses
+    rng = random.Random(seed)
+    velocity = np.array([rng.uniform(*speed_range) for _ in range(samples)])
+    decel = np.array([rng.uniform(*decel_rate) for _ in range(samples)])
+    expected = np.array([sum(spin_velocities(v, d))
+        for v, d in zip(velocity, decel)])
+    return max(np.abs(travel(velocity, decel) - expected).max(),
+        np.abs(travel_fixed(velocity, decel) - expected).max())
+
+
+def report(model, layout, wins):
+    spins = wins.sum()
+    expected = np.array([angle for _, angle in layout]) / 360
+    observed = wins / spins
+
+    # How many standard deviations each wedge is from its fair share
+    spread = np.sqrt(spins * expected * (1 - expected))
+    z = np.divide(wins - spins * expected, spread,
+        out=np.zeros(len(wins)), where=spread > 0)
+    chi2 = float(((wins - spins * expected) ** 2 / (spins * expected)).sum())
+
+    return {
+        "spins": int(spins),
+        "chi2": chi2,
+        "dof": len(wins) - 1,
+        "wedges": [{"name": model.name(i), "key": model.key(i),
+            "expected": float(p), "observed": float(o), "z": float(zz)}
+            for i, (p, o, zz) in enumerate(zip(expected, observed, z))]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spins", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=200_000)
+    parser.add_argument("--start", type=float,
+        help="start every spin from this angle instead of a random one")
+    parser.add_argument("--sheet", action="store_true",
+        help="read the live queue instead of snapshot.json")
+    parser.add_argument("--rows", type=int,
+        help="simulate a generated list of this many rows instead")
+    parser.add_argument("--dupes", type=float, default=0.0,
+        help="fraction of generated rows sharing a name with another row")
+    parser.add_argument("--extras", type=int, default=0)
+    parser.add_argument("--combine", type=int, choices=(0, 1))
+    parser.add_argument("--interleave", type=int, choices=(0, 1))
+    parser.add_argument("--speed-range", type=float, nargs=2)
+    parser.add_argument("--decel-rate", type=float, nargs=2)
+    parser.add_argument("--decel-change", type=int, choices=(0, 1))
+    parser.add_argument("--check", type=int, default=100,
+        help="spins to compare against the wheel's own physics, 0 to skip")
+    parser.add_argument("--top", type=int, default=10,
+        help="how many of the least fair wedges to list")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--wheel",
+        help="name of the [[wheels]] entry to simulate, the first by default")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    import sorcle
+    wheels = sorcle.wheel_settings(sorcle.settings)
+    settings = next((w for w in wheels if w["name"] == args.wheel), None)
+    if args.wheel and not settings:
+        parser.error(f"no wheel named {args.wheel!r}")
+    settings = settings or wheels[0]
+    source = sorcle.make_source(settings)
+    s_wheel = settings["wheel"]
+
+    # The snapshot holds the wheel as it was laid out on import, it can't be
+    # laid out again with other settings
+    if ((args.combine is not None or args.interleave is not None)
+        and not (args.sheet or args.rows)):
+        parser.error("--combine and --interleave need --sheet or --rows")
+
+    if args.combine is not None:
+        s_wheel["combine_dupes"] = bool(args.combine)
+    if args.interleave is not None:
+        s_wheel["interleave"] = bool(args.interleave)
+    speed_range = args.speed_range or s_wheel["speed_range"]
+    decel_rate = args.decel_rate or s_wheel["decel_rate"]
+    decel_change = s_wheel["decel_change"] if args.decel_change is None \
+        else bool(args.decel_change)
+
+    if args.rows:
+        random.seed(args.seed)
+        bench.configure(settings, args.rows, s_wheel["combine_dupes"],
+            s_wheel["interleave"], args.extras)
+        source = sorcle.SheetSource(settings)
+        source.sheet = bench.FakeWorksheet(source.s_config["sheet"],
+            bench.make_rows(args.rows, args.dupes, args.extras))
+        model = source.read_spreadsheet()
+    elif args.sheet:
+        model = source.read_spreadsheet()
+    else:
+        snapshot = source.load_snapshot()
+        if not snapshot:
+            parser.error("no snapshot.json from the current settings to "
+                "simulate, use --sheet or --rows")
+        model = snapshot["model"]
+
+    if not len(model):
+        parser.error("nothing on the wheel to simulate")
+
+    if args.check:
+        diff = check_physics(args.check, speed_range, decel_rate, args.seed)
+        print(f"physics check: {args.check} spins within {diff:.2e} degrees")
+
+    layout = sorcle.wedge_layout(model)
+    start = time.perf_counter()
+    wins = simulate([a for a, _ in layout], args.spins, speed_range,
+        decel_rate, decel_change, args.start, args.seed, args.batch)
+    elapsed = time.perf_counter() - start
+
+    result = report(model, layout, wins)
+    result["seconds"] = elapsed
+
+    print(f"{result['spins']} spins of {len(model)} wedges in "
+        f"{elapsed:.2f}s ({result['spins'] / elapsed:,.0f} spins/s)")
+    print(f"chi-squared {result['chi2']:.1f} on {result['dof']} degrees of "
+        f"freedom (about {result['dof']} if fair)")
+
+    print(f"{'wedge':<40}{'expected %':>12}{'observed %':>12}{'z':>8}")
+    for w in sorted(result["wedges"], key=lambda w: -abs(w["z"]))[:args.top]:
+        print(f"{w['name'][:39]:<40}{w['expected'] * 100:>12.4f}"
+            f"{w['observed'] * 100:>12.4f}{w['z']:>8.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "result": result}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
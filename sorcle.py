@@ -1,36 +1,177 @@
+import sys
+from time import perf_counter
+# Startup is timed from here, see --profile-startup
+start_time = perf_counter()
+
 import pyglet
 import pathlib
-import sys, os
+import os
 from os import path
-from random import choice, randint
-from glob import glob
-import requests
+from random import choice
 from datetime import datetime
-import string
+import threading
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from math import radians, ceil
+from bisect import bisect_right
 
-from itertools import chain, zip_longest
+from pyglet.math import Mat4, Vec3
+from pyglet.image.buffer import Framebuffer, Renderbuffer
 
 from text_fix import ArcadeTextLayoutGroup
+from control import Control
+from metrics import metrics
+from scheduler import Scheduler
+from spin import plan_spin, draw, new_seed
+from output import Output, TextSink, JSONSink, WebSocketSink
+from audio import Audio, sounds
+from loader import Loader
+from model import WheelModel
+from sources import (Source, CSVSource, SQLiteSource, col_to_int,
+    col_to_str)
 
 if getattr(sys, 'frozen', False):
     w_dir = pathlib.Path(sys._MEIPASS).parent
 else:
     w_dir = os.path.dirname(os.path.abspath(__file__))
-pyglet.resource.path = [str(w_dir)]
+metrics.phase("imports", start_time)
 
 import tomllib
-with open(path.join(w_dir, "settings.toml"), "rb") as f:
+settings_file = path.join(w_dir, "settings.toml")
+with open(settings_file, "rb") as f:
     settings = tomllib.load(f)
-s_move = settings["move"]
-s_config = settings["spreadsheet"]
-s_wheel = settings["wheel"]
-s_window = settings["window"]
-
-import gspread
-client = gspread.service_account(filename=path.join(w_dir, "account.json"))
-spreadsheet = client.open_by_key(s_config["id"])
-sheet = spreadsheet.worksheet(s_config["sheet"])
 
+# gspread is imported on first use, it's slow and only needed off the
+# render thread. One authenticated client and spreadsheet handle per id, shared by every
+# wheel so several wheels don't each log in and open the same spreadsheet
+client = None
+spreadsheets = {}
+client_lock = threading.Lock()
+
+
+def make_scheduler(settings):
+    s_quota = settings["quota"]
+    return Scheduler(read_per_minute=s_quota["read_per_minute"],
+        write_per_minute=s_quota["write_per_minute"],
+        retries=s_quota["retries"], backoff=s_quota["backoff"],
+        timeout=settings["spreadsheet"]["import_timeout"])
+
+# Every Sheets request goes through here to stay under quota, which is
+# per account so it's shared by every wheel too
+scheduler = make_scheduler(settings)
+
+
+def open_spreadsheet(id):
+    # Authenticate on first use so startup doesn't wait on the network
+    global client
+    with client_lock:
+        if not client:
+            with metrics.startup("sheets login"):
+                import gspread
+                client = gspread.service_account(
+                    filename=path.join(w_dir, "account.json"))
+                # Requests wait forever by default, holding up the worker
+                # and every import and move queued behind it
+                client.set_timeout(settings["spreadsheet"]["import_timeout"])
+        if id not in spreadsheets:
+            with metrics.startup("sheets open"):
+                spreadsheets[id] = scheduler.read("open_by_key",
+                    client.open_by_key, id)
+        return spreadsheets[id]
+
+
+def wheel_settings(settings):
+    """Full settings for each wheel.
+
+    Every [[wheels]] entry is layered over the rest of settings.toml, so a
+    wheel only lists what's different about it. Without any there's just
+    the one wheel, using the program's own folder.
+    """
+    wheels = []
+    for i, overrides in enumerate(settings.get("wheels") or [{}]):
+        wheel = {section: dict(values) for section, values in settings.items()
+            if isinstance(values, dict)}
+        for section, values in overrides.items():
+            if isinstance(values, dict):
+                wheel.setdefault(section, {}).update(values)
+
+        if "wheels" in settings:
+            wheel["name"] = overrides.get("name", f"wheel{i+1}")
+            wheel["dir"] = path.join(w_dir, overrides.get("dir", wheel["name"]))
+        else:
+            wheel["name"] = "sorcle"
+            wheel["dir"] = w_dir
+        wheels.append(wheel)
+    return wheels
+
+
+def reload_settings(wheel, index=0):
+    """Re-read settings.toml into a wheel's existing section dicts.
+
+    Returns the keys that changed in each section. The quota is reset here,
+    the authenticated client is kept.
+    """
+    global scheduler
+
+    with open(settings_file, "rb") as f:
+        new = tomllib.load(f)
+
+    if new.get("quota") != settings.get("quota"):
+        scheduler = make_scheduler(new)
+    scheduler.timeout = new["spreadsheet"]["import_timeout"]
+    if client:
+        client.set_timeout(new["spreadsheet"]["import_timeout"])
+    settings.clear()
+    settings.update(new)
+
+    wheels = wheel_settings(new)
+    if index >= len(wheels):
+        print(f"Wheel {wheel['name']} was removed, restart to apply")
+        return {}
+
+    changed = {}
+    for section, values in wheels[index].items():
+        if not isinstance(values, dict):
+            continue
+        # Update in place, everything holds on to the section dicts
+        old = wheel.setdefault(section, {})
+        keys = {k for k in old.keys() | values.keys()
+            if old.get(k) != values.get(k)}
+        if keys:
+            changed[section] = keys
+            old.clear()
+            old.update(values)
+
+    return changed
+
+def decode_image(file):
+    # Image or animated GIF, anchored at its center
+    with metrics.startup(f"decode {file}"):
+        if file.rsplit(".")[1] == "gif":
+            image = pyglet.image.load_animation(path.join(w_dir, file))
+            for f in image.frames:
+                f.image.anchor_x = f.image.width//2
+                f.image.anchor_y = f.image.height//2
+        else:
+            image = pyglet.image.load(path.join(w_dir, file))
+            image.anchor_x = image.width//2
+            image.anchor_y = image.height//2
+        return image
+
+# Textures are only made once the images are drawn
+images = Loader(decode_image)
+
+def icon_image(image):
+    # First frame of an animation
+    if isinstance(image, pyglet.image.Animation):
+        return image.frames[0].image
+    return image
+
+def get_key(winner, append_key=True):
+    # Key to show alongside the winner's name, if any
+    if append_key and winner.key != winner.name:
+        return winner.key.rsplit('/', 1)[1]
+    return ""
 
 def get_text_color(color):
     color_intensity = (color[0]*.299 + color[1]*.587 + color[2]*.114)
@@ -39,347 +180,791 @@ def get_text_color(color):
     else:
         return (255, 255, 255)
 
-def delete_files():
-    if pathlib.Path(path.join(w_dir, "spin")).is_file():
-        os.remove(path.join(w_dir, "spin"))
-    if pathlib.Path(path.join(w_dir, "import")).is_file():
-        os.remove(path.join(w_dir, "import"))
-    if pathlib.Path(path.join(w_dir, "move")).is_file():
-        os.remove(path.join(w_dir, "move"))
-
-def col_to_int(col):
-    num = 0
-    for c in col:
-        if c in string.ascii_letters:
-            num = num * 26 + (ord(c.upper()) - ord('A')) + 1
-    return num
-
-def col_to_str(col):
-    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-    result = []
-    while col:
-        col, rem = divmod(col-1, 26)
-        result[:0] = letters[rem]
-    return ''.join(result)
+def delete_files(t_dir):
+    for trigger in ("spin", "import", "move", "draw"):
+        if pathlib.Path(path.join(t_dir, trigger)).is_file():
+            os.remove(path.join(t_dir, trigger))
+
+def write_metrics(dt):
+    # Timings are for the whole process, however many wheels
+    try:
+        metrics.write(path.join(w_dir, settings["metrics"]["file"]),
+            settings["metrics"]["format"])
+    except OSError as e:
+        print(f"Couldn't write metrics: {e}")
+
+def wedge_layout(model):
+    # (start angle, angle) for each wedge, sized by how many rows it holds
+    layout = []
+    wedge_num = len(model.rows)
+    if wedge_num:
+        angle_per_wedge = 360 / wedge_num
 
+    curr_angle = 0.0
+    for i in range(len(model)):
+        wedge_angle = model.weight(i) * angle_per_wedge
+        layout.append((curr_angle, wedge_angle))
+        curr_angle += wedge_angle
+    return layout
+
+def wedge_segments(angle):
+    # Same smoothness as pyglet's full circle default, spread by angle,
+    # rather than every thin wedge getting a whole circle's worth
+    return max(1, ceil(int(495 / 1.25) * angle / 360))
+
+def wedge_font_size(angle):
+    # Adjust font size for smaller wedges
+    if angle < 1.6: font_floor = 6
+    elif angle < 3.2: font_floor = 10
+    else: font_floor = 14
+    font_size = angle * .70 + font_floor
+    if font_size > 23:
+        font_size = 23
+    # Whole sizes so labels share fonts and glyph atlases
+    return round(font_size)
+
+
+class SheetSource(Source):
+    """One wheel's queue and history sheets.
+
+    Every request goes through the shared scheduler to stay under quota.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.spreadsheet = None
+        self.sheet = None
+        self.move_sheet = None
+
+    def connect(self):
+        if self.sheet:
+            return
+        self.spreadsheet = open_spreadsheet(self.s_config["id"])
+        self.sheet = scheduler.read("worksheet", self.spreadsheet.worksheet,
+            self.s_config["sheet"])
+
+    def reset(self, changed):
+        # Reopen sheets on next use if settings point somewhere else
+        if {"id", "sheet"} & changed.get("spreadsheet", set()):
+            self.spreadsheet = self.sheet = self.move_sheet = None
+        if "sheet" in changed.get("move", set()):
+            self.move_sheet = None
+
+    def modified(self):
+        self.connect()
+        return scheduler.read("modified_time",
+            self.spreadsheet.get_lastUpdateTime)
+
+    def read_block(self, left_col, right_col, start_row, max_row):
+        self.connect()
+        return scheduler.read("get", self.sheet.get,
+            f"{col_to_str(left_col)}{start_row}:{col_to_str(right_col)}{max_row}"
+            ), None
+
+    def read_rows(self, rows):
+        self.connect()
+        first_col = self.s_config["first_column"]
+        last_col = self.s_config["last_column"]
+        values = scheduler.read("batch_get", self.sheet.batch_get,
+            [f"{first_col}{row}:{last_col}{row}" for row in rows])
+        return [v[0] if v else [] for v in values]
+
+    def append_rows(self, rows):
+        from gspread.utils import ValueInputOption
+        s_move = self.s_move
+
+        self.connect()
+        if not self.move_sheet:
+            self.move_sheet = scheduler.read("worksheet",
+                self.spreadsheet.worksheet, s_move["sheet"])
+
+        end_col = col_to_str(col_to_int(s_move['column']) + len(rows[0]))
+        scheduler.write("append_rows", self.move_sheet.append_rows, rows,
+            table_range=f"{s_move['column']}{s_move['row']}:{end_col}9999",
+            value_input_option=ValueInputOption.user_entered)
+
+    def delete_rows(self, rows, values):
+        # Delete bottom up in one request so earlier deletes don't shift rows
+        self.connect()
+        scheduler.write("batch_update", self.spreadsheet.batch_update,
+            {"requests": [
+                {"deleteDimension": {"range": {
+                    "sheetId": self.sheet.id, "dimension": "ROWS",
+                    "startIndex": row - 1, "endIndex": row}}}
+                for row in sorted(rows, reverse=True)]})
+
+
+# Backends by [spreadsheet] source
+source_types = {"sheets": SheetSource, "csv": CSVSource,
+    "sqlite": SQLiteSource}
+
+def make_source(settings):
+    return source_types[settings["spreadsheet"]["source"]](settings)
+
+
+class Offscreen:
+    """A texture to draw into instead of the window.
+
+    Drawn multisampled like the window when samples is set, and resolved
+    into the texture afterwards. The texture is filtered smoothly whatever
+    nearest_neighbour says, since it's drawn rotated or read back.
+    """
+
+    def __init__(self, width, height, samples=0):
+        gl = pyglet.gl
+        self.width = width
+        self.height = height
+        self.texture = pyglet.image.Texture.create(width, height,
+            min_filter=gl.GL_LINEAR, mag_filter=gl.GL_LINEAR)
+        self.framebuffer = Framebuffer()
+        self.framebuffer.attach_texture(self.texture)
+
+        self.renderbuffer = None
+        self.target = self.framebuffer
+        if samples > 1:
+            max_samples = gl.GLint()
+            gl.glGetIntegerv(gl.GL_MAX_SAMPLES, max_samples)
+            self.renderbuffer = Renderbuffer(width, height, gl.GL_RGBA8,
+                min(samples, max_samples.value))
+            self.target = Framebuffer()
+            self.target.attach_renderbuffer(self.renderbuffer)
+
+    def bind(self):
+        self.target.bind()
+
+    def resolve(self):
+        # Copy the multisampled drawing into the texture, back to the window
+        gl = pyglet.gl
+        if self.renderbuffer:
+            gl.glBindFramebuffer(gl.GL_READ_FRAMEBUFFER, self.target.id)
+            gl.glBindFramebuffer(gl.GL_DRAW_FRAMEBUFFER, self.framebuffer.id)
+            gl.glBlitFramebuffer(0, 0, self.width, self.height,
+                0, 0, self.width, self.height, gl.GL_COLOR_BUFFER_BIT,
+                gl.GL_NEAREST)
+        self.framebuffer.unbind()
+
+    def delete(self):
+        # The texture lives on
+        if self.renderbuffer:
+            self.target.delete()
+            self.renderbuffer.delete()
+        self.framebuffer.delete()
+
+
+class WheelGroup(pyglet.graphics.Group):
+    """Rotates everything drawn under it around the wheel's center.
+
+    Wedges and labels are built once at their resting angle and the whole
+    wheel is turned through the window's view matrix, so a frame costs the
+    same no matter how many entries there are.
+    """
+
+    def __init__(self, window, order=0, parent=None):
+        super().__init__(order=order, parent=parent)
+        self.window = window
+        self.rotation = 0.0
+        self._prev_view = None
+
+    def set_state(self):
+        self._prev_view = self.window.view
+        self.window.view = (self._prev_view
+            @ Mat4.from_translation(Vec3(500, 500, 0))
+            @ Mat4.from_rotation(radians(-self.rotation), Vec3(0, 0, 1))
+            @ Mat4.from_translation(Vec3(-500, -500, 0)))
+
+    def unset_state(self):
+        self.window.view = self._prev_view
+
+    # Each wheel has its own rotation, never merge it with another's
+    def __eq__(self, other):
+        return self is other
+
+    def __hash__(self):
+        return id(self)
 
 
 class Wedge(pyglet.shapes.Sector):
 
-    def __init__(self, name, sub, extras, rows, key,
-        start_angle, angle, color, wedge_group, text_group, batch):
+    def __init__(self, model, index,
+        start_angle, angle, color, wedge_group, text_group, batch, s_wheel):
 
+        self.segments = wedge_segments(angle)
         super().__init__(x = 500, y = 500, radius=495,
             start_angle = start_angle, angle = angle, color = color,
-            group = wedge_group, batch=batch)
+            segments = self.segments, group = wedge_group, batch=batch)
+
+        # The entry this wedge shows, read from the model when needed
+        self.model = model
+        self.index = index
+
+        # Labels are built later by Wheel.build_labels
+        self.s_wheel = s_wheel
+        self.text_group = text_group
+        self.label = None
+        self.label_pending = False
 
-        self.name = name
-        self.sub = sub
-        self.extras = extras
-        self.rows = rows
-        self.key = key
+    def build_label(self):
+        # Too thin to read, don't spend a layout on it
+        if self.angle < self.s_wheel["label_min_angle"]:
+            return
 
         # Trim name if too long
-        if len(name) > 23:
-            disp_name = name[:21] + "..."
+        if len(self.name) > 23:
+            disp_name = self.name[:21] + "..."
         else:
-            disp_name = name
-
-        # Adjust font size for smaller wedges
-        if angle < 1.6: font_floor = 6
-        elif angle < 3.2: font_floor = 10
-        else: font_floor = 14
-        font_size = angle * .70 + font_floor
-        if font_size > 23:
-            font_size = 23
+            disp_name = self.name
 
         self.label = pyglet.text.Label(
-            text=disp_name, font_name=settings["wheel"]["font"], x=500, y=500, 
-            font_size=font_size, color=get_text_color(color), width=485,
-            align='right', anchor_y='center', group=text_group, batch=batch,
-            rotation=(-(start_angle+(start_angle+angle))/2))
-
-    def rotate(self, velocity):
-        self.rotation = (self.rotation + velocity) % 360
-        self.label.rotation = (self.label.rotation + velocity) % 360
-
-        if self.start_angle == 0.0:
-            return self.rotation < self.angle
-        else:
-            return (self.rotation - self.start_angle) % 360 < self.rotation
+            text=disp_name, font_name=self.s_wheel["font"], x=500, y=500, 
+            font_size=wedge_font_size(self.angle),
+            color=get_text_color(self.color), width=485, align='right',
+            anchor_y='center', group=self.text_group, batch=self.batch,
+            rotation=(-(self.start_angle+(self.start_angle+self.angle))/2))
+
+    @property
+    def name(self):
+        return self.model.name(self.index)
+
+    @property
+    def key(self):
+        return self.model.key(self.index)
+
+    @property
+    def rows(self):
+        return self.model.get_rows(self.index)
+
+    @property
+    def ids(self):
+        return self.model.get_ids(self.index)
+
+    @property
+    def sub(self):
+        return self.model.get_subs(self.index)
+
+    @property
+    def extras(self):
+        return self.model.get_extras(self.index)
+
+    def update(self, model, index, start_angle, angle, color):
+        # Reused across imports, only touch vertices that actually changed
+        self.model = model
+        self.index = index
+
+        if self.start_angle != start_angle or self.angle != angle:
+            self.start_angle = start_angle
+            self.angle = angle
+
+            if self.label and angle < self.s_wheel["label_min_angle"]:
+                self.label.delete()
+                self.label = None
+            elif self.label:
+                self.label.rotation = -(start_angle+(start_angle+angle))/2
+
+                font_size = wedge_font_size(angle)
+                if self.label.font_size != font_size:
+                    self.label.font_size = font_size
+
+        if self.color[:-1] != color:
+            self.color = color
+            if self.label:
+                self.label.color = get_text_color(color)
+
+    def delete(self):
+        if self.label:
+            self.label.delete()
+        super().delete()
 
 class Wheel:
     
-    def __init__(self, center_sprite, batch):
+    def __init__(self, window, center_sprite, batch, settings, source,
+        model=None):
+        self.settings = settings
+        self.s_wheel = settings["wheel"]
+        self.source = source
+        self.model = WheelModel()
         self.wedges = []
         self.spinning = False
         self.finished = False
         self.idle = True
         self.selected = None
+        self.angle = 0.0
+        self.step_velocity = 0.0
+        self.start_angles = []
+        self.index = 0
+        self.unlabelled = []
 
         self.batch = batch
-        self.wedge_group = pyglet.graphics.Group(order=0)
-        self.text_group = pyglet.graphics.Group(order=1)
+        self.rotate_group = WheelGroup(window, order=0)
+        self.wedge_group = pyglet.graphics.Group(
+            order=0, parent=self.rotate_group)
+        self.text_group = pyglet.graphics.Group(
+            order=1, parent=self.rotate_group)
 
         self.center_sprite = center_sprite
+        self.center_offset = center_sprite.rotation
 
         self.colors = []
-        for color in settings["wheel"]["colors"]:
+        for color in self.s_wheel["colors"]:
             self.colors.append(tuple(color))
 
-        self.import_spreadsheet()
+        self.import_spreadsheet(model)
 
 
-    def import_spreadsheet(self):
-        self.wedges = []
+    def import_spreadsheet(self, model=None):
+        # The model may already have been read off the render thread
+        if model is None:
+            model = self.source.read_spreadsheet()
+        self.model = model
 
-        # Setup list of columns to scan
-        columns_to_scan = [s_config["primary_column"]]
-        if s_config["sub_column"]:
-            columns_to_scan.append(s_config["sub_column"])
-        if s_config["extra_columns"]:
-            for c in s_config["extra_columns"]:
-                columns_to_scan.append(c)
-
-        if s_config["key_column"] and s_config["primary_column"] != s_config["key_column"]:
-            columns_to_scan.append(s_config["key_column"])
-            use_key = True
-        else: use_key = False
-
-        start_row = s_config["start_row"]
-
-        # max_rows may be a file name
-        if isinstance(s_config["max_rows"], str):
-            with open(s_config["max_rows"]) as f:
-                max_row = int(f.read())
-                max_row = max_row - 1 + start_row
-        else:
-            max_row = s_config["max_rows"]-1 + start_row
-
-        ranges = [f"{c}{start_row}:{c}{max_row}"
-            for c in columns_to_scan]
-        columns = sheet.batch_get(ranges)
-
-        # Handle resulting 
-        rows = columns[0]
-        columns.pop(0)
-        if s_config["sub_column"]:
-            sub_rows = columns[0]
-            columns.pop(0)
-        if s_config['extra_columns']:
-            extra_rows = []
-            for c in s_config["extra_columns"]:
-                extra_rows.append(columns[0])
-                columns.pop(0)
-        if use_key:
-            keys = columns[0]
-
-        # Grab all values, filter out empty and handle dupe logic
-        wedge_dict = {}
-        for i, row in enumerate(rows):
-            if row:
-                if use_key:
-                    key = f"{row[0]}/{keys[i][0]}"
-                elif not s_wheel["combine_dupes"]:
-                    key = f"{row[0]}/{i}"
-                else:
-                    key = f"{row[0]}"
-
-                print(key)
-
-                try: sub = sub_rows[i][0]
-                except: sub = ""
-                try: extras = [x[i][0] for x in extra_rows]
-                except: extras = []
-
-                if not (s_wheel["remove_dupes"] and key in wedge_dict):
-                    wedge_dict.setdefault(key, [])
-                    wedge_dict[key].append({"name": row[0], "sub": [sub],
-                        "extras": [extras], "rows": [start_row + i],
-                        "key": key})
-
-        # Calculate angle for wedges
-        wedge_vals = wedge_dict.values()
-
-        print(wedge_vals)
-        wedge_num = sum(len(w) for w in wedge_vals)
-        angle_per_wedge = 360 / wedge_num
+        # Reuse wedges with the same name, preferring an exact key match
+        old_wedges = {}
+        for wedge in self.wedges:
+            old_wedges.setdefault(wedge.name, []).append(wedge)
+
+        self.wedges = []
+        self.start_angles = []
+        self.selected = None
+        self.idle = True
 
-        curr_angle = 0.0
         color = (0,0,0)
-        
-        # Option to combine the two halves of the list alternating
-        if s_wheel["interleave"]:
-            wedge_vals = [x for x in chain(*zip_longest(
-                list(wedge_vals)[:len(wedge_vals)//2],
-                list(wedge_vals)[len(wedge_vals)//2:])) if x is not None]
-
-        print(wedge_vals)
- 
-        for i, v in enumerate(wedge_vals):
-
-            # If we're combining wedges, move everything into first wedge
-            if len(v) > 1 and s_wheel["combine_dupes"]:
-                for j in range(1, len(v)):
-
-                    if s_wheel["combine_subs"]:
-                        if v[j]["sub"][0] not in v[0]["sub"]:
-                            v[0]["sub"].extend(v[j]["sub"])
-                    else:
-                        v[0]["sub"].extend(v[j]["sub"])
-                        
-                    v[0]["extras"].extend(v[j]["extras"])
-                    v[0]["rows"].extend(v[j]["rows"])
-
-                v = [v[0]]
-
-            for w in v:
-                wedge_angle = len(w["rows"]) * angle_per_wedge
-
-                # Make sure colors don't repeat
-                valid_colors = self.colors[:]
-                if i > 0:
-                    valid_colors.remove(color)
-                    if (int(curr_angle + wedge_angle) == 360
-                        and self.wedges[0].color[:-1] != color
-                        and len(valid_colors) > 1):
-                        valid_colors.remove(self.wedges[0].color[:-1])
 
+        for i, (curr_angle, wedge_angle) in enumerate(wedge_layout(model)):
+            name = model.name(i)
+
+            wedge = None
+            # Vertex count is fixed, so it needs enough segments for its angle
+            reusable = [x for x in old_wedges.get(name, [])
+                if x.segments >= wedge_segments(wedge_angle)]
+            if reusable:
+                wedge = next((x for x in reusable if x.key == model.key(i)),
+                    reusable[0])
+                old_wedges[name].remove(wedge)
+
+            # Make sure colors don't repeat
+            valid_colors = self.colors[:]
+            if i > 0:
+                valid_colors.remove(color)
+                if (int(curr_angle + wedge_angle) == 360
+                    and self.wedges[0].color[:-1] != color
+                    and len(valid_colors) > 1):
+                    valid_colors.remove(self.wedges[0].color[:-1])
+
+            # Keep a reused wedge's color where it still fits
+            if wedge and wedge.color[:-1] in valid_colors:
+                color = wedge.color[:-1]
+            else:
                 color = choice(valid_colors)
 
-                self.wedges.append(Wedge(name=w["name"],
-                    sub=w["sub"], extras=w["extras"], rows=w["rows"],
+            if wedge:
+                wedge.update(model=model, index=i, start_angle=curr_angle,
+                    angle=wedge_angle, color=color)
+            else:
+                wedge = Wedge(model=model, index=i,
                     start_angle=curr_angle, angle=wedge_angle, color=color,
                     wedge_group=self.wedge_group, text_group=self.text_group,
-                    batch=self.batch, key=w["key"]))
+                    batch=self.batch, s_wheel=self.s_wheel)
 
-                curr_angle += wedge_angle
+            self.wedges.append(wedge)
+            self.start_angles.append(curr_angle)
 
+        # Free anything that didn't survive the import from the batch
+        for reusable in old_wedges.values():
+            for wedge in reusable:
+                wedge.delete()
 
-    def rotate(self, velocity):
-        if settings["center"]["rotate"]:
-            self.center_sprite.rotation = (
-                self.center_sprite.rotation + velocity) % 360
+        self.index = self.wedge_at(self.angle)
 
+        # Queue missing labels, nearest the pointer last so it pops first
         for wedge in self.wedges:
-            is_selected = wedge.rotate(velocity)
-            if self.spinning and is_selected:
-                if self.selected != wedge:
-                    self.selected = wedge
+            wedge.label_pending = (wedge.label is None
+                and wedge.angle >= self.s_wheel["label_min_angle"])
+        self.unlabelled = sorted(
+            (w for w in self.wedges if w.label_pending),
+            key=lambda w: -((w.start_angle + w.angle - self.angle) % 360))
+
+    def build_labels(self, budget):
+        """Build up to budget missing labels.
+
+        While spinning only wedges about to pass the pointer are labelled,
+        otherwise the rest are filled in nearest the pointer first.
+        """
+        if self.spinning:
+            first = self.wedge_at(self.angle)
+            last = self.wedge_at(self.angle + self.s_wheel["label_lookahead"])
+            for i in range((last - first) % len(self.wedges) + 1):
+                wedge = self.wedges[(first + i) % len(self.wedges)]
+                if budget <= 0:
+                    return
+                if wedge.label_pending:
+                    wedge.build_label()
+                    wedge.label_pending = False
+                    budget -= 1
+        else:
+            while self.unlabelled and budget > 0:
+                wedge = self.unlabelled.pop()
+                if wedge.label_pending:
+                    wedge.build_label()
+                    wedge.label_pending = False
+                    budget -= 1
+
+    def wedge_at(self, angle):
+        # Pointer sits at 0 degrees, so the wheel angle is the pointer's
+        # position on the unrotated wheel
+        return bisect_right(self.start_angles, angle % 360) - 1
 
+    def rotate(self, velocity):
+        self.angle = (self.angle + velocity) % 360
+        self.step_velocity = velocity
 
-class Sorcle(pyglet.window.Window):
+        if not self.wedges:
+            return
 
-    def __init__(self, config):
+        self.index = self.wedge_at(self.angle)
+        if self.spinning:
+            self.selected = self.wedges[self.index]
 
-        super().__init__(width = 1200, height = 1000, 
-            caption = "sorcle", config = config,
-            style=f"{'transparent' if s_window['transparent'] else 'dialog'}")
+    def interpolate(self, alpha):
+        # Draw partway between the last two physics steps
+        angle = self.angle - self.step_velocity * (1 - alpha)
+        self.rotate_group.rotation = angle
 
-        pyglet.text.layout.TextLayout.group_class = ArcadeTextLayoutGroup
+        if self.settings["center"]["rotate"]:
+            self.center_sprite.rotation = (self.center_offset + angle) % 360
 
-        icon = pyglet.image.load(path.join(w_dir, settings["center"]["file"]))
-        self.set_icon(icon)
 
-        # For crisp pixel scaling
-        if s_window["nearest_neighbour"]:
-            pyglet.image.Texture.default_mag_filter = pyglet.gl.GL_NEAREST
-            pyglet.image.Texture.default_min_filter = pyglet.gl.GL_NEAREST
+class Sorcle(pyglet.window.Window):
+
+    def __init__(self, config, settings, index=0, refresh=False, **kwargs):
+
+        # This wheel's settings, see wheel_settings
+        self.settings = settings
+        self.index = index
+        self.s_config = settings["spreadsheet"]
+        self.s_move = settings["move"]
+        self.s_wheel = settings["wheel"]
+        self.s_window = settings["window"]
+        self.s_output = settings["output"]
+        name = settings["name"]
+
+        # Images and sounds decode on their own threads meanwhile
+        images.preload(settings["center"]["file"])
+        images.preload(settings["pointer"]["file"])
+        sounds.preload(path.join(w_dir, settings["tick"]["file"]))
+        sounds.preload(path.join(w_dir, settings["finished"]["file"]))
+
+        # Imports are fetched on a worker thread and swapped in when ready
+        self.source = make_source(settings)
+        self.import_executor = ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix=f"{name} import")
+        self.import_future = None
+        self.import_queued = False
+        self.import_started = 0.0
+        self.imported = False
+        # Moves submitted and not yet finished, by job id
+        self.moves = {}
+
+        # Finish any moves that were interrupted last time
+        self.retry_moves()
+
+        # Show the last import straight away, refreshed in the background.
+        # Started before the window so logging in and fetching overlap
+        # creating it
+        with metrics.startup(f"{name} snapshot"):
+            self.snapshot = self.source.load_snapshot()
+        if refresh:
+            self.import_started = None
+            self.import_future = self.import_executor.submit(
+                self.run_import, self.snapshot)
+
+        with metrics.startup(f"{name} window"):
+            super().__init__(width = 1200, height = 1000, 
+                caption = name, config = config,
+                style=f"{'transparent' if self.s_window['transparent'] else 'dialog'}",
+                **kwargs)
+
+        pyglet.text.layout.TextLayout.group_class = ArcadeTextLayoutGroup
+
+        self.set_filters()
 
-        #self.fps_display = pyglet.window.FPSDisplay(self)
         self.batch = pyglet.graphics.Batch()
 
         self.sprite_group = pyglet.graphics.Group(order=3)
-        if settings["center"]["file"].rsplit(".")[1] == "gif":
-            center = pyglet.resource.animation(settings["center"]["file"])
-            for f in center.frames:
-                f.image.anchor_x = f.image.width//2
-                f.image.anchor_y = f.image.height//2
-        else:
-            center = pyglet.image.load(
-                path.join(w_dir, settings["center"]["file"]))
-            center.anchor_x = center.width//2
-            center.anchor_y = center.height//2
-        self.center_sprite = pyglet.sprite.Sprite(center,
-            x=500, y=500, group=self.sprite_group, batch=self.batch)
-        self.center_sprite.update(scale=settings["center"]["scale"])
-
-        self.wheel = Wheel(self.center_sprite, self.batch)
-
-        # Position pointer, change anchor keeping centered regardless of size
-        if settings["pointer"]["file"].rsplit(".")[1] == "gif":
-            pointer = pyglet.resource.animation(settings["pointer"]["file"])
-            for f in pointer.frames:
-                f.image.anchor_x = f.image.width//2
-                f.image.anchor_y = f.image.height//2
-        else:
-            pointer = pyglet.image.load(
-                path.join(w_dir, settings["pointer"]["file"]))
-            pointer.anchor_x = pointer.width//2
-            pointer.anchor_y = pointer.height//2
-        self.pointer_sprite = pyglet.sprite.Sprite(pointer,
-            x=settings["pointer"]["x_pos"], y=settings["pointer"]["y_pos"],
-            group=self.sprite_group, batch=self.batch)
-        self.pointer_sprite.update(scale=settings["pointer"]["scale"])
-
-        self.sound = pyglet.media.load(
-            path.join(w_dir, settings["tick"]["file"]), streaming=False)
-        self.player = None
+        with metrics.startup(f"{name} sprites"):
+            center = images.load(self.settings["center"]["file"])
+            self.center_sprite = pyglet.sprite.Sprite(center,
+                x=500, y=500, group=self.sprite_group, batch=self.batch)
+            self.center_sprite.update(scale=self.settings["center"]["scale"])
+            self.set_icon(icon_image(center))
+
+            # Position pointer, centered regardless of size
+            pointer = images.load(self.settings["pointer"]["file"])
+            self.pointer_sprite = pyglet.sprite.Sprite(pointer,
+                x=self.settings["pointer"]["x_pos"],
+                y=self.settings["pointer"]["y_pos"],
+                group=self.sprite_group, batch=self.batch)
+            self.pointer_sprite.update(scale=self.settings["pointer"]["scale"])
+
+        with metrics.startup(f"{name} wheel"):
+            self.wheel = Wheel(self, self.center_sprite, self.batch, settings,
+                self.source,
+                model=self.snapshot["model"] if self.snapshot else WheelModel())
+
+        with metrics.startup(f"{name} audio"):
+            self.audio = self.load_audio()
 
         self.winner_group = pyglet.graphics.Group(order=5)
         self.winner_label = None
         self.background_group = pyglet.graphics.Group(order=4)
         self.winner_bg = None
         self.sub = None
-
-        self.decel = 0
-
-    def handle_win(self, winner):
-        separator = s_config["separator"]
-
-        if s_wheel["append_key"] and winner.key != winner.name:
-            key = winner.key.rsplit('/', 1)[1]
+        # Drawn winners stay on screen through the imports that follow,
+        # until the next spin, draw or import trigger
+        self.drawn = False
+
+        self.output = self.load_output()
+
+        self.import_label = pyglet.text.Label("Importing...",
+            font_name=self.s_wheel["font"], font_size=18, x=1190, y=10,
+            color=(255, 255, 255), anchor_x='right', anchor_y='bottom',
+            group=self.winner_group, batch=self.batch)
+        self.import_label.visible = self.import_future is not None
+
+        # Idle drawing, see idle_mode in settings.toml
+        self.idle_mode = self.s_window["idle_mode"]
+        self.idle_time = 0.0
+        self.dirty = True
+        self.wheel_sprite = None
+        self.wheel_sprite_group = pyglet.graphics.Group(order=0)
+
+        # The spin playing, see spin.py
+        self.spin = None
+        self.spin_tick = 0
+        self.spin_start = 0.0
+        self.crossings = None
+        self.spin_winner = None
+
+        # Spin physics run at a fixed rate, independent of the frame rate
+        self.tick = 1 / self.s_wheel["tick_rate"]
+        self.accumulator = 0.0
+        self.last_update = perf_counter()
+        pyglet.clock.schedule_interval(self.update, self.tick)
+        self.set_clear_color()
+        self.last_draw = None
+
+        # Optional timing overlay, see [metrics]
+        self.overlay = None
+        self.overlay_group = pyglet.graphics.Group(order=6)
+        if self.settings["metrics"]["overlay"]:
+            self.overlay = pyglet.text.Label("", font_name="Arial",
+                font_size=10, x=10, y=990, width=400, multiline=True,
+                color=(255, 255, 255), anchor_y='top',
+                group=self.overlay_group, batch=self.batch)
+            pyglet.clock.schedule_interval(self.update_overlay, 0.5)
+
+        # Each wheel has its own folder for trigger files
+        self.control = Control(settings["dir"],
+            poll_interval=self.settings["control"]["poll_interval"],
+            http_port=self.settings["control"]["http_port"])
+        self.control.start()
+
+        # Pick up edits to settings.toml without restarting
+        self.settings_mtime = os.stat(settings_file).st_mtime
+        if self.settings["control"]["reload_interval"]:
+            pyglet.clock.schedule_interval(self.check_settings,
+                self.settings["control"]["reload_interval"])
+
+        # Local queues are cheap to check, import as soon as they change
+        if self.s_config["watch_interval"]:
+            pyglet.clock.schedule_interval(self.check_source,
+                self.s_config["watch_interval"])
+
+    def load_audio(self):
+        return Audio(path.join(w_dir, self.settings["tick"]["file"]),
+            path.join(w_dir, self.settings["finished"]["file"]),
+            tick_volume=self.settings["tick"]["volume"],
+            finish_volume=self.settings["finished"]["volume"],
+            players=self.settings["tick"]["players"],
+            min_interval=self.settings["tick"]["min_interval"])
+
+    def load_output(self):
+        # Where results go, see [output]
+        sinks = []
+        if self.s_output["text_files"]:
+            sinks.append(TextSink(self.settings["dir"]))
+        if self.s_output["json_file"]:
+            sinks.append(JSONSink(
+                path.join(self.settings["dir"], self.s_output["json_file"])))
+        if self.s_output["websocket_port"]:
+            sinks.append(WebSocketSink(self.s_output["websocket_port"]))
+        return Output(sinks)
+
+    def set_filters(self):
+        # For crisp pixel scaling
+        if self.s_window["nearest_neighbour"]:
+            pyglet.image.Texture.default_mag_filter = pyglet.gl.GL_NEAREST
+            pyglet.image.Texture.default_min_filter = pyglet.gl.GL_NEAREST
         else:
-            key = ""
-        
-        with open(path.join(w_dir, "winner.txt"), 'w', encoding='utf-8') as f:
-            if key:
-                f.write(f"{winner.name} ({key})")
-            else:
-                f.write(winner.name)
+            pyglet.image.Texture.default_mag_filter = pyglet.gl.GL_LINEAR
+            pyglet.image.Texture.default_min_filter = pyglet.gl.GL_LINEAR
 
-        if winner.sub:
-            with open(path.join(w_dir, "sub.txt"), 'w', encoding='utf-8') as f:
-                f.write(separator.join(winner.sub))
-        else:
-            with open(path.join(w_dir, "sub.txt"), 'w', encoding='utf-8') as f:
-                f.write("")
-
-        extra_files = glob(path.join(w_dir,"extra*.txt"))
-        for file in extra_files:
-            with open(file, 'w') as f:
-                f.write("")
-        if winner.extras:
+    def check_settings(self, dt):
+        # Wait for the spin to finish rather than change it midway
+        if self.wheel.spinning:
+            return
+
+        try:
+            mtime = os.stat(settings_file).st_mtime
+        except OSError:
+            return
+        if mtime == self.settings_mtime:
+            return
+        self.settings_mtime = mtime
+
+        try:
+            changed = reload_settings(self.settings, self.index)
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            print(f"Couldn't reload settings: {e}")
+            return
+
+        if changed:
+            print(f"Reloaded {self.settings['name']} settings: "
+                f"{', '.join(sorted(changed))}")
+            self.source.reset(changed)
+            # A typo mid-stream shouldn't take the wheel down with it
+            try:
+                # Anything built here belongs to this window's context
+                self.switch_to()
+                self.apply_settings(changed)
+            except Exception as e:
+                print(f"Couldn't apply settings: {e}")
+
+    def check_source(self, dt):
+        # Not while spinning or with a winner still to move
+        if self.wheel.spinning or not self.wheel.idle or self.import_future:
+            return
+        if self.source.changed():
+            self.start_import()
+
+    def apply_settings(self, changed):
+        """Rebuild only what the changed settings affect."""
+        self.dirty = True
+        self.uncache_wheel()
+
+        sheet_keys = changed.get("spreadsheet", set())
+        wheel_keys = changed.get("wheel", set())
+        window_keys = changed.get("window", set())
+
+        if "source" in sheet_keys:
+            self.source = self.wheel.source = make_source(self.settings)
+
+        if "watch_interval" in sheet_keys:
+            pyglet.clock.unschedule(self.check_source)
+            if self.s_config["watch_interval"]:
+                pyglet.clock.schedule_interval(self.check_source,
+                    self.s_config["watch_interval"])
+
+        # Anything deciding which entries are on the wheel needs an import
+        if (sheet_keys - {"import_timeout", "separator", "watch_interval"}
+            or wheel_keys & {"remove_dupes", "combine_dupes", "combine_subs",
+                "interleave"}):
+            self.start_import()
+
+        if wheel_keys & {"colors", "font", "label_min_angle"}:
+            self.wheel.colors = [tuple(c) for c in self.s_wheel["colors"]]
+            model = self.wheel.model
+            # Same entries, so a winner still waiting to be moved stays
+            selected, idle = self.wheel.selected, self.wheel.idle
+            self.wheel.import_spreadsheet(WheelModel())
+            self.wheel.import_spreadsheet(model)
+            if selected:
+                self.wheel.selected = self.wheel.wedges[selected.index]
+            self.wheel.idle = idle
+
+        if "tick_rate" in wheel_keys:
+            pyglet.clock.unschedule(self.update)
+            self.tick = 1 / self.s_wheel["tick_rate"]
+            pyglet.clock.schedule_interval(self.update, self.tick)
+
+        if "nearest_neighbour" in window_keys:
+            self.set_filters()
+            images.clear()
+
+        if "center" in changed or "nearest_neighbour" in window_keys:
+            self.center_sprite.image = images.load(
+                self.settings["center"]["file"])
+            self.center_sprite.scale = self.settings["center"]["scale"]
+            self.set_icon(icon_image(self.center_sprite.image))
+
+        if "pointer" in changed or "nearest_neighbour" in window_keys:
+            self.pointer_sprite.image = images.load(
+                self.settings["pointer"]["file"])
+            self.pointer_sprite.update(x=self.settings["pointer"]["x_pos"],
+                y=self.settings["pointer"]["y_pos"],
+                scale=self.settings["pointer"]["scale"])
+
+        if "tick" in changed or "finished" in changed:
+            self.audio.delete()
+            self.audio = self.load_audio()
+
+        if "output" in changed:
+            self.output.close()
+            self.output = self.load_output()
+
+        if window_keys & {"bg_color", "transparent"}:
+            self.set_clear_color()
+        if "idle_mode" in window_keys:
+            self.idle_mode = self.s_window["idle_mode"]
+
+        if "poll_interval" in changed.get("control", set()):
+            self.control.poll_interval = (
+                self.settings["control"]["poll_interval"])
+
+        # These are only read when the window and services start
+        restart = ([f"window.{k}" for k in window_keys & {"samples", "transparent"}]
+            + [f"control.{k}" for k in changed.get("control", set())
+                & {"http_port", "reload_interval"}]
+            + [f"metrics.{k}" for k in changed.get("metrics", set())])
+        if restart:
+            print(f"Restart to apply: {', '.join(sorted(restart))}")
+
+    def write_results(self, winners):
+        separator = self.s_config["separator"]
+        append_key = self.s_wheel["append_key"]
+
+        names = []
+        for winner in winners:
+            key = get_key(winner, append_key)
+            names.append(f"{winner.name} ({key})" if key else winner.name)
+
+        extras = [row for winner in winners for row in winner.extras]
+        extra_text = []
+        if extras:
             # Turn rows[columns[]] into columns[rows[]]
-            new_matrix = []
-            for i in range(0, len(winner.extras[0])):
-                new_matrix.append([row[i] for row in winner.extras])
-
-            for ex_count, col in enumerate(new_matrix, start=1):
+            for i in range(0, len(extras[0])):
                 # Remove duplicates
-                col = list(dict.fromkeys(col))
+                col = list(dict.fromkeys(row[i] for row in extras))
+                extra_text.append(separator.join(col))
+
+        # Written by the sinks on their own thread, see [output]
+        self.output.write({
+            "winner": separator.join(names),
+            "sub": separator.join(
+                sub for winner in winners for sub in winner.sub),
+            "extras": extra_text,
+            "winners": [{"name": w.name, "key": get_key(w, append_key),
+                "sub": w.sub, "extras": w.extras, "color": w.color[:3]}
+                for w in winners]})
 
-                with open(path.join(w_dir, f"extra{ex_count}.txt"), 'w', encoding='utf-8') as f:
-                    f.write(separator.join(col))
+    def handle_win(self, winner):
+        key = get_key(winner, self.s_wheel["append_key"])
+        self.write_results([winner])
 
-        if not s_wheel["suppress_win"]:
-            finished = pyglet.media.load(
-                path.join(w_dir, settings["finished"]["file"]))
-            finished.play().volume = settings["finished"]["volume"]
+        if not self.s_wheel["suppress_win"]:
+            self.audio.finish()
 
             # Print winner name
             self.winner_label = pyglet.text.Label(winner.name,
-                font_name=s_wheel["font"], font_size=64, 
+                font_name=self.s_wheel["font"], font_size=64, 
                 width=900, multiline=True, x=500, y=500, 
                 color=get_text_color(winner.color),
                 anchor_x='center', anchor_y='center', align='center',
@@ -395,7 +980,7 @@ class Sorcle(pyglet.window.Window):
 
             if winner.sub:
                 self.sub = pyglet.text.Label("\n\n".join(winner.sub),
-                    font_name=settings["wheel"]["font"], font_size=32,
+                    font_name=self.s_wheel["font"], font_size=32,
                     width=900, multiline=True,
                     x=500, y=500-(self.winner_label.content_height//2)-25,
                     color=get_text_color(winner.color),
@@ -415,153 +1000,440 @@ class Sorcle(pyglet.window.Window):
                 self.sub.y += (self.sub.content_height//2)
 
 
-    def move_winner(self, winner, reason):
+    def move_winners(self, winners, reason):
+        # All winners go in one job, so one read, append and delete
+        rows = [row for winner in winners for row in winner.rows]
+        # A digest of what each row held when imported, so a row that's
+        # since been changed or shifted isn't moved in its place
+        ids = [row_id for winner in winners for row_id in winner.ids]
+
+        # Journal first so the move survives a crash or network drop,
+        # then run it on the worker ahead of the import that follows
+        job = {"id": f"{datetime.now().timestamp()}/{winners[0].key}",
+            "rows": rows, "ids": ids, "reason": reason,
+            "date": datetime.today().strftime(self.s_move["date_format"]),
+            "values": None, "appended": False}
+        self.source.journal.update(job)
+        future = self.submit_move(job)
+
+        if self.s_move["cut_max"]:
+            if isinstance(self.s_config["max_rows"], str):
+                with open(self.s_config["max_rows"], "a+") as f:
+                    m_rows = f.read()
+                    f.seek(0)
+                    f.write(int(m_rows) - len(rows))
+                    f.truncate()
+            else:
+                self.s_config["max_rows"] -= len(rows)
 
-        move_sheet = spreadsheet.worksheet(s_move["sheet"])
+        return future
 
-        left_col = col_to_int(s_config["first_column"])
-        right_col = col_to_int(s_config["last_column"])
 
-        move_rows = []
-        for i, row in enumerate(winner.rows):
+    def submit_move(self, job):
+        future = self.import_executor.submit(self.source.run_move, job)
+        self.moves[job["id"]] = future
+        future.add_done_callback(lambda f: self.finish_move(job, f))
+        return future
 
-            row_values = []
-            if s_move["prepend_date"]:
-                row_values.append(datetime.today().strftime(s_move["date_format"]))
+    def finish_move(self, job, future):
+        # Runs on the import thread. A failed job stays in the journal
+        self.moves.pop(job["id"], None)
+        if not future.cancelled() and future.exception():
+            print(f"Move failed, rows {job['rows']} not written to history: "
+                f"{future.exception()}. Retrying on the next import")
 
-            row_values.extend(
-                sheet.row_values(row - i)[left_col-1:right_col])
+    def retry_moves(self):
+        # Journalled moves that aren't running, failed or left from last time
+        for job in self.source.journal.pending():
+            if job["id"] not in self.moves:
+                self.submit_move(job)
 
-            if reason:
-                row_values.append(reason)
+    def set_clear_color(self):
+        if self.s_window["transparent"]:
+            pyglet.gl.glClearColor(0, 0, 0, 0)
+        else:
+            pyglet.gl.glClearColor(
+                self.s_window["bg_color"][0],
+                self.s_window["bg_color"][1],
+                self.s_window["bg_color"][2], 1)
+
+    def cache_wheel(self):
+        # Render the wheel at rest once, idle frames then draw a single quad
+        offscreen = Offscreen(self.width, self.height, self.s_window["samples"])
+
+        rotation = self.wheel.rotate_group.rotation
+        self.wheel.rotate_group.rotation = 0
+        others = (self.sprite_group, self.background_group, self.winner_group,
+            self.overlay_group)
+        for group in others:
+            group.visible = False
+
+        offscreen.bind()
+        pyglet.gl.glClearColor(0, 0, 0, 0)
+        pyglet.gl.glClear(pyglet.gl.GL_COLOR_BUFFER_BIT)
+        self.batch.draw()
+        offscreen.resolve()
+        offscreen.delete()
+        self.set_clear_color()
+
+        for group in others:
+            group.visible = True
+        self.wheel.rotate_group.rotation = rotation
+        self.wheel.rotate_group.visible = False
+
+        texture = offscreen.texture
+        texture.anchor_x = 500
+        texture.anchor_y = 500
+        self.wheel_sprite = pyglet.sprite.Sprite(texture, x=500, y=500,
+            group=self.wheel_sprite_group, batch=self.batch)
+
+    def uncache_wheel(self):
+        if self.wheel_sprite:
+            self.wheel_sprite.delete()
+            self.wheel_sprite = None
+            self.wheel.rotate_group.visible = True
+
+    def update_overlay(self, dt):
+        self.overlay.text = metrics.overlay_text()
+        self.dirty = True
+
+    def log_result(self, seed, start, names):
+        # Enough to replay a disputed spin by putting "seed angle" in spin,
+        # draws log "draw" in place of the angle
+        if not self.s_wheel["spin_log"]:
+            return
+
+        line = (f"{datetime.now().isoformat(timespec='seconds')}\t"
+            f"{seed}\t{start}\t{'; '.join(names)}")
+        print(f"Result: {line}")
+        with open(path.join(self.settings["dir"], self.s_wheel["spin_log"]),
+            "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def is_idle(self):
+        return not (self.wheel.spinning or self.import_future)
+
+    def clear_winner(self):
+        if self.winner_label:
+            self.winner_label.delete()
+            self.winner_label = None
+            self.winner_bg.delete()
+            self.winner_bg = None
+            if self.sub:
+                self.sub.delete()
+                self.sub = None
+
+    def handle_command(self, command, text):
+        self.dirty = True
+
+        if command == "move":
+            # Only move once there's a winner on screen
+            if not self.s_move["enabled"] or self.wheel.idle:
+                return
+
+            self.move_winners([self.wheel.selected], text)
+            # Refresh the wheel
+            command = "import"
+
+        if command == "import":
+            self.drawn = False
+            self.retry_moves()
+            self.start_import()
+
+        elif command == "draw":
+            if not self.wheel.wedges:
+                return
+
+            # Several winners at once without spinning, "draw" holds how
+            # many followed by an optional reason for the move
+            count, _, reason = text.partition(" ")
+            try:
+                count = int(count or 1)
+            except ValueError:
+                count = 0
+            if count < 1:
+                print(f"Can't draw {text!r}, expected a number of winners")
+                return
+            self.draw_winners(count, reason.strip())
+
+        elif command == "spin":
+            if not self.wheel.wedges:
+                return
+
+            # "spin" can hold a seed, and optionally a starting angle, from
+            # spins.log to replay that spin exactly
+            seed, angle = new_seed(), None
+            try:
+                values = text.split()
+                if values:
+                    seed = int(values[0])
+                if len(values) > 1:
+                    angle = float(values[1])
+            except ValueError:
+                print(f"Can't replay spin from {text!r}, spinning randomly")
+
+            self.start_spin(plan_spin(seed, self.s_wheel["speed_range"],
+                self.s_wheel["decel_rate"], self.s_wheel["decel_change"]), angle)
+
+    def draw_winners(self, count, reason):
+        seed = new_seed()
+        model = self.wheel.model
+        picks = draw([model.weight(i) for i in range(len(model))], count, seed)
+        winners = [self.wheel.wedges[i] for i in picks]
+        names = [w.name for w in winners]
+        color = winners[0].color
+
+        self.clear_winner()
+        self.uncache_wheel()
+
+        self.write_results(winners)
+        self.log_result(seed, "draw", names)
+        if self.s_move["enabled"]:
+            self.move_winners(winners, reason)
+
+        # Take the winners off the wheel, the import after moving them
+        # brings it back in line with the sheet
+        picked = set(picks)
+        self.wheel.import_spreadsheet(model.subset(
+            i for i in range(len(model)) if i not in picked))
+        if self.s_move["enabled"]:
+            self.start_import()
+
+        if not self.s_wheel["suppress_win"]:
+            self.audio.finish()
+
+            self.winner_label = pyglet.text.Label(
+                "\n".join(names),
+                font_name=self.s_wheel["font"], font_size=32,
+                width=900, multiline=True, x=500, y=500,
+                color=get_text_color(color),
+                anchor_x='center', anchor_y='center', align='center',
+                group=self.winner_group, batch=self.batch)
 
-            move_rows.append(row_values)
+            self.winner_bg = pyglet.shapes.BorderedRectangle(
+                x=500-(self.winner_label.content_width//2)-25,
+                y=500-(self.winner_label.content_height//2)-25,
+                width=self.winner_label.content_width+50,
+                height=self.winner_label.content_height+50,
+                color=color, border_color=get_text_color(color),
+                group=self.background_group, batch=self.batch)
+            self.drawn = True
+
+    def start_spin(self, spin, angle=None):
+        # Clear winner on re-spin
+        self.clear_winner()
+        self.drawn = False
+        self.uncache_wheel()
+
+        if angle is not None:
+            self.wheel.angle = angle
+            self.wheel.index = self.wheel.wedge_at(angle)
+
+        self.wheel.spinning = True
+        self.wheel.idle = False
+        self.spin = spin
+        self.spin_tick = 0
+        self.spin_start = self.wheel.angle
+        self.crossings = spin.crossings(self.wheel.start_angles, self.wheel.angle)
+
+        # The result is known before the wheel moves, log it now so it's on
+        # record even if the program stops mid-spin
+        self.spin_winner = self.wheel.wedges[
+            spin.winner(self.wheel.start_angles, self.spin_start)]
+        self.log_result(spin.seed, repr(self.spin_start),
+            [self.spin_winner.name])
+
+    def start_import(self, snapshot=None):
+        # Already fetching, run once more afterwards to catch any changes
+        # made since it started, however many imports were asked for
+        if self.import_future:
+            self.import_queued = True
+            return
+
+        self.import_started = None
+        self.import_future = self.import_executor.submit(
+            self.run_import, snapshot)
+        self.import_label.visible = True
+
+    def run_import(self, snapshot):
+        # Timed from when the worker gets to it, not while it waits behind
+        # a move
+        self.import_started = perf_counter()
+        return self.source.refresh_spreadsheet(snapshot)
+
+    def finish_import(self):
+        if not self.import_future.done():
+            if (self.import_started is not None and perf_counter()
+                - self.import_started > self.s_config["import_timeout"]):
+                # Can't cancel a running request, just stop waiting on it.
+                # The request gives up by itself after import_timeout too
+                print("Import timed out")
+                self.import_future = None
+                self.import_queued = False
+                self.import_label.visible = False
+            return
+
+        future = self.import_future
+        self.import_future = None
+        self.import_label.visible = False
+
+        if not self.imported:
+            metrics.phase(f"{self.settings['name']} first import",
+                self.import_started)
+            self.imported = True
+
+        if self.import_queued:
+            self.import_queued = False
+            self.start_import()
+
+        try:
+            model = future.result()
+        except Exception as e:
+            print(f"Import failed: {e}")
+            return
+
+        # Snapshot was already up to date
+        if model is None:
+            return
+
+        # Clear winner on re-import
+        if not self.drawn:
+            self.clear_winner()
+        self.uncache_wheel()
+
+        self.wheel.import_spreadsheet(model)
+        self.dirty = True
+
+    def update(self, dt):
+        # Other wheels share the event loop, make sure anything built this
+        # tick lands in this window's context
+        self.switch_to()
+
+        self.accumulator += dt
+        while self.accumulator >= self.tick:
+            with metrics.timer("step"):
+                self.step()
+            self.accumulator -= self.tick
+        self.last_update = perf_counter()
+
+        if self.is_idle():
+            if self.idle_mode == "none" and not self.dirty:
+                return
+
+            if self.idle_mode == "low_fps":
+                self.idle_time += dt
+                if self.idle_time < 1 / self.s_window["idle_fps"] and not self.dirty:
+                    return
+                self.idle_time = 0.0
+
+        now = perf_counter()
+        first = self.last_draw is None
+        if not first:
+            metrics.observe("frame_interval", now - self.last_draw)
+        self.last_draw = now
+
+        self.dirty = False
+        with metrics.timer("frame"):
+            self.draw(dt)
+        if first:
+            metrics.phase(f"{self.settings['name']} first frame", now)
+
+    def step(self):
+        if self.wheel.unlabelled:
+            self.wheel.build_labels(self.s_wheel["labels_per_tick"])
+            self.dirty = True
 
-            sheet.delete_rows(row - i)
+        if self.wheel.spinning:
+            # Play back the precomputed spin
+            with metrics.timer("rotate"):
+                self.wheel.rotate(self.spin.velocities[self.spin_tick])
+            self.spin_tick += 1
 
-        end_col = col_to_str(
-            col_to_int(s_move['column']) + len(move_rows[0]))
+            # Tick as the pointer crosses each boundary, the frame drawn
+            # next shows this step interpolating in over the coming tick
+            self.audio.schedule_ticks(
+                [t * self.tick for t in next(self.crossings)])
 
-        move_sheet.append_rows(move_rows,
-            table_range=f"{s_move['column']}{s_move['row']}:{end_col}9999",
-            value_input_option=gspread.utils.ValueInputOption.user_entered)
+            if self.spin_tick == len(self.spin):
+                self.wheel.spinning = False
+                self.wheel.step_velocity = 0.0
 
-        if s_move["cut_max"]:
-            if isinstance(s_config["max_rows"], str):
-                with open(s_config["max_rows"], "a+") as f:
-                    m_rows = f.read()
-                    f.seek(0)
-                    f.write(int(m_rows) - len(winner.rows))
-                    f.truncate()
-            else:
-                s_config["max_rows"] -= len(winner.rows)
+                self.wheel.selected = self.spin_winner
+                self.handle_win(self.wheel.selected)
+                self.dirty = True
 
+                # Drop triggers sent mid-spin to mitigate accidental presses
+                self.control.clear()
+        else:
+            if self.wheel.idle and self.idle_mode != "none":
+                # Ambient rotating
+                self.wheel.rotate(0.02)
+
+            if self.import_future:
+                self.finish_import()
+                return
+
+            command = self.control.get()
+            if command:
+                command, text, queued = command
+                metrics.observe(f"trigger_wait.{command}",
+                    perf_counter() - queued)
+                self.handle_command(command, text)
 
     def on_draw(self):
         self.clear()
 
-        if self.wheel.spinning:
-            # If new wedge at pointer, play sound
-            try: old_name = self.wheel.selected.name
-            except: old_name = ""
-            self.wheel.rotate(self.velocity)
-            if old_name != self.wheel.selected.name:
-                # Play sound if there isn't one, stopped or has been 33ms
-                if not self.player:
-                    self.player = self.sound.play()
-                    self.player.volume = settings["tick"]["volume"]
-                elif self.player.time >= 1/30 or not self.player.playing:
-                    self.player = self.sound.play()
-                    self.player.volume = settings["tick"]["volume"]
-
-            if self.velocity < 0.003:
-                self.velocity -= 0.003
-            else:
+        alpha = (self.accumulator + perf_counter() - self.last_update) / self.tick
+        self.wheel.interpolate(min(alpha, 1.0))
 
-                if s_wheel["decel_change"]:
-                    decel = randint(
-                        s_wheel["decel_rate"][0] * 100,
-                        s_wheel["decel_rate"][1] * 100) / 100
+        if (self.idle_mode == "sprite" and self.is_idle()
+            and self.wheel.wedges and not self.wheel.unlabelled):
+            if not self.wheel_sprite:
+                self.cache_wheel()
+            self.wheel_sprite.rotation = self.wheel.rotate_group.rotation
 
-                self.velocity -= self.velocity * (self.decel / 100)
+        with metrics.timer("draw"):
+            self.batch.draw()
 
-            if self.velocity < 0:
-                self.wheel.spinning = False
 
-                self.handle_win(self.wheel.selected)
+def make_config(s_window):
+    config = pyglet.gl.Config()
+    if s_window["samples"]:
+        config.sample_buffers = 1
+        config.samples = s_window["samples"]
+    return config
 
-                # Delete trigger files to mitigate accidental presses
-                delete_files()
-        else:
-            if self.wheel.idle:
-                # Ambient rotating
-                self.wheel.rotate(0.02)
+def report_startup(dt, windows):
+    # Once every wheel is on screen with its first import in
+    if all(w.last_draw and w.imported for w in windows):
+        pyglet.clock.unschedule(report_startup)
+        print(metrics.startup_report(start_time))
 
-            else:
-                if s_move["enabled"]:
-                    if pathlib.Path(path.join(w_dir, "move")).is_file():
-
-                        with open(pathlib.Path(path.join(w_dir, "move"))) as f:
-                            reason = f.read().rstrip()
-
-                        self.move_winner(self.wheel.selected, reason)
-                        os.remove(path.join(w_dir, "move"))
-
-                        # Create an import file to refresh the wheel
-                        with open(pathlib.Path(path.join(w_dir, "import")), "w") as f:
-                            f.write(" ")
-
-
-            if pathlib.Path(path.join(w_dir, "import")).is_file():
-                # Clear winner on re-import
-                if self.winner_label:
-                    self.winner_label = None
-                    self.winner_bg = None
-                    if self.sub:
-                        self.sub = None
-
-                self.wheel = None
-                self.wheel = Wheel(self.center_sprite, self.batch)
-                os.remove(path.join(w_dir, "import"))
-
-            elif pathlib.Path(path.join(w_dir, "spin")).is_file():
-                # Clear winner on re-spin
-                if self.winner_label:
-                    self.winner_label = None
-                    self.winner_bg = None
-                    if self.sub:
-                        self.sub = None      
-
-                self.wheel.spinning = True
-                self.wheel.idle = False
-                # Random spin duration
-                self.velocity = randint(
-                    s_wheel["speed_range"][0] * 100,
-                    s_wheel["speed_range"][1] * 100) / 100.0
-
-                self.decel = randint(
-                    s_wheel["decel_rate"][0] * 100,
-                    s_wheel["decel_rate"][1] * 100) / 100
-                print(self.decel)
-
-                os.remove(path.join(w_dir, "spin"))       
-
-        #self.fps_display.draw()
-        self.batch.draw()
+def main():
+    parser = argparse.ArgumentParser(description="Spinning wheel for OBS")
+    parser.add_argument("--profile-startup", action="store_true",
+        help="print how long each part of startup took")
+    args = parser.parse_args()
 
+    # One window per wheel, all driven by the same event loop and sharing
+    # the Sheets client, images, sounds and fonts
+    windows = []
+    for index, wheel in enumerate(wheel_settings(settings)):
+        os.makedirs(wheel["dir"], exist_ok=True)
+        delete_files(wheel["dir"])
 
-delete_files()
+        windows.append(Sorcle(make_config(wheel["window"]), wheel, index,
+            refresh=True))
 
-config = pyglet.gl.Config()
-config.sample_buffers = 1
-config.samples = 8
+    if settings["metrics"]["file"]:
+        pyglet.clock.schedule_interval(write_metrics,
+            settings["metrics"]["interval"])
+    if args.profile_startup:
+        pyglet.clock.schedule_interval(report_startup, 0.1, windows)
 
-window = Sorcle(config)
+    # Sorcle.update decides when to draw
+    pyglet.app.run(None)
 
-if not s_window["transparent"]:
-    pyglet.gl.glClearColor(
-        s_window["bg_color"][0],
-        s_window["bg_color"][1],
-        s_window["bg_color"][2], 1)
 
-pyglet.app.run()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,562 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import string
+from itertools import chain, zip_longest
+from os import path
+from urllib.request import pathname2url
+
+from metrics import metrics
+from model import WheelModel
+from output import write_atomic
+from scheduler import Journal
+
+
+def col_to_int(col):
+    num = 0
+    for c in col:
+        if c in string.ascii_letters:
+            num = num * 26 + (ord(c.upper()) - ord('A')) + 1
+    return num
+
+def col_to_str(col):
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    result = []
+    while col:
+        col, rem = divmod(col-1, 26)
+        result[:0] = letters[rem]
+    return ''.join(result)
+
+def trim(row):
+    # Blank cells at the end of a row aren't sent by Sheets, match that
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+def digest(values):
+    # Stands in for what a row held, kept for every row on the wheel and in
+    # the snapshot, so it's short rather than a copy of the row
+    return hashlib.blake2b(json.dumps(values).encode(),
+        digest_size=8).hexdigest()
+
+
+class Source:
+    """Where a wheel's entries are read from and its winners moved to.
+
+    Rows and columns are addressed like the sheet whatever the backend,
+    row 1 being the first row and column A the first column, so the same
+    [spreadsheet] and [move] settings work for all of them. Subclasses
+    fetch and move rows, imports and journalled moves are built on those.
+    Everything but changed runs off the render thread.
+    """
+
+    def __init__(self, settings):
+        self.s_config = settings["spreadsheet"]
+        self.s_wheel = settings["wheel"]
+        self.s_move = settings["move"]
+        self.dir = settings["dir"]
+
+        self.snapshot_file = path.join(self.dir, "snapshot.json")
+        # Moves not yet finished, replayed on the next start
+        self.journal = Journal(path.join(self.dir, "moves.json"))
+        # What modified gave for the last import
+        self.version = None
+
+    def reset(self, changed):
+        # Settings changed, drop anything opened with the old ones
+        pass
+
+    def changed(self):
+        # Cheap check polled by the window, True if an import is due
+        return False
+
+    def modified(self):
+        """Something that changes whenever the rows do."""
+        raise NotImplementedError
+
+    def read_block(self, left_col, right_col, start_row, max_row):
+        """rows[columns[]] of the given block and an id for each row.
+
+        Blank cells may be left out. ids is None if rows are known by what
+        they hold, the digest of first_column to last_column trimmed as
+        read_rows gives.
+        """
+        raise NotImplementedError
+
+    def read_rows(self, rows):
+        """first_column to last_column of each row, trimmed."""
+        raise NotImplementedError
+
+    def append_rows(self, rows):
+        """Add rows to the end of the history."""
+        raise NotImplementedError
+
+    def delete_rows(self, rows, values):
+        """Delete rows, values being what each should still hold."""
+        raise NotImplementedError
+
+    def get_max_row(self):
+        start_row = self.s_config["start_row"]
+
+        # max_rows may be a file name
+        if isinstance(self.s_config["max_rows"], str):
+            with open(self.s_config["max_rows"]) as f:
+                max_row = int(f.read())
+                return max_row - 1 + start_row
+        else:
+            return self.s_config["max_rows"]-1 + start_row
+
+    def snapshot_source(self):
+        # Everything that changes what an import produces
+        return {"spreadsheet": self.s_config, "max_row": self.get_max_row(),
+            "wheel": {k: self.s_wheel[k] for k in ("remove_dupes",
+                "combine_dupes", "combine_subs", "interleave")}}
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_file, encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if (snapshot.get("source") != self.snapshot_source()
+            or "model" not in snapshot):
+            return None
+        snapshot["model"] = WheelModel.from_dict(snapshot["model"])
+        return snapshot
+
+    def save_snapshot(self, model, modified):
+        snapshot = {"source": self.snapshot_source(), "modified": modified,
+            "model": model.to_dict()}
+        write_atomic(self.snapshot_file,
+            json.dumps(snapshot, separators=(",", ":")))
+
+    def refresh_spreadsheet(self, snapshot=None):
+        """Import and save a snapshot of the result.
+
+        Returns None instead if nothing has been modified since the given
+        snapshot was taken.
+        """
+        # Taken before reading, so a write part way through imports again
+        modified = self.modified()
+        if snapshot and snapshot["modified"] == modified:
+            self.version = modified
+            return None
+
+        model = self.read_spreadsheet()
+        try:
+            self.save_snapshot(model, modified)
+        except OSError as e:
+            print(f"Couldn't save snapshot: {e}")
+        self.version = modified
+        return model
+
+    def read_spreadsheet(self):
+        """Fetch and parse the configured rows into a WheelModel."""
+        s_config = self.s_config
+        s_wheel = self.s_wheel
+
+        use_key = (s_config["key_column"]
+            and s_config["primary_column"] != s_config["key_column"])
+
+        # Fetch one block covering every configured column
+        columns_to_scan = [s_config["first_column"], s_config["last_column"],
+            s_config["primary_column"]]
+        if s_config["sub_column"]:
+            columns_to_scan.append(s_config["sub_column"])
+        columns_to_scan.extend(s_config["extra_columns"])
+        if use_key:
+            columns_to_scan.append(s_config["key_column"])
+
+        left_col = min(col_to_int(c) for c in columns_to_scan)
+        right_col = max(col_to_int(c) for c in columns_to_scan)
+
+        start_row = s_config["start_row"]
+        block, ids = self.read_block(left_col, right_col, start_row,
+            self.get_max_row())
+        if ids is None:
+            first = col_to_int(s_config["first_column"]) - left_col
+            last = col_to_int(s_config["last_column"]) - left_col + 1
+            ids = [digest(trim(row[first:last])) for row in block]
+
+        # Turn rows[columns[]] into columns[rows[]], padding out blank cells
+        def column(col):
+            i = col_to_int(col) - left_col
+            return [row[i] if i < len(row) else "" for row in block]
+
+        names = column(s_config["primary_column"])
+        subs = column(s_config["sub_column"]) if s_config["sub_column"] else None
+        extra_cols = [column(c) for c in s_config["extra_columns"]]
+        keys = column(s_config["key_column"]) if use_key else None
+
+        # Group row indices by key, filtering out empty and handling dupes
+        groups = {}
+        for i, name in enumerate(names):
+            if name:
+                if use_key:
+                    key = f"{name}/{keys[i]}"
+                elif not s_wheel["combine_dupes"]:
+                    key = f"{name}/{i}"
+                else:
+                    key = name
+
+                if key not in groups:
+                    groups[key] = [i]
+                elif not s_wheel["remove_dupes"]:
+                    groups[key].append(i)
+
+        groups = list(groups.items())
+
+        # Option to combine the two halves of the list alternating
+        if s_wheel["interleave"]:
+            half = len(groups) // 2
+            groups = [x for x in
+                chain(*zip_longest(groups[:half], groups[half:]))
+                if x is not None]
+
+        model = WheelModel(len(extra_cols))
+        for key, indices in groups:
+            name = names[indices[0]]
+
+            # If we're combining wedges, move everything into one entry
+            if s_wheel["combine_dupes"]:
+                wedges = [indices]
+            else:
+                wedges = [[i] for i in indices]
+
+            for wedge in wedges:
+                wedge_subs = [subs[i] if subs else "" for i in wedge]
+                if len(wedge) > 1 and s_wheel["combine_subs"]:
+                    wedge_subs = list(dict.fromkeys(wedge_subs))
+
+                model.add(name, key, [start_row + i for i in wedge],
+                    wedge_subs,
+                    [[column[i] for i in wedge] for column in extra_cols],
+                    [ids[i] for i in wedge])
+
+        return model
+
+    def history_rows(self, job, values):
+        # What's added to the history for each moved row
+        rows = []
+        for row in values:
+            row_values = []
+            if self.s_move["prepend_date"]:
+                row_values.append(job["date"])
+
+            row_values.extend(row)
+
+            if job["reason"]:
+                row_values.append(job["reason"])
+
+            rows.append(row_values)
+        return rows
+
+    def run_move(self, job):
+        """Move a journalled winner's rows to the history.
+
+        Progress is saved to the journal after each step, so a job replayed
+        after a failure carries on from where it stopped.
+        """
+        # Read every row in one request, and only move rows still holding
+        # what they did when imported
+        fresh = job["values"] is None
+        if fresh:
+            ids = job.get("ids") or [None] * len(job["rows"])
+            moved = [(row, values) for row, values, row_id in
+                zip(job["rows"], self.read_rows(job["rows"]), ids)
+                if values and row_id in (None, digest(values))]
+            if len(moved) != len(job["rows"]):
+                print(f"Rows changed since import, not moving "
+                    f"{sorted(set(job['rows']) - {r for r, _ in moved})}")
+            if not moved:
+                self.journal.remove(job)
+                return
+
+            job["rows"] = [row for row, _ in moved]
+            job["values"] = [values for _, values in moved]
+            self.journal.update(job)
+
+        # Append before deleting so a failure can't lose a row
+        if not job["appended"]:
+            self.append_rows(self.history_rows(job, job["values"]))
+            job["appended"] = True
+            self.journal.update(job)
+
+        rows, values = job["rows"], job["values"]
+        if not fresh:
+            # Replaying, only delete rows that still hold what was moved
+            current = self.read_rows(job["rows"])
+            kept = [(row, old) for row, old, new in
+                zip(job["rows"], job["values"], current) if new == old]
+            rows, values = [r for r, _ in kept], [v for _, v in kept]
+            if len(rows) != len(job["rows"]):
+                print(f"Rows changed since move started, not deleting "
+                    f"{sorted(set(job['rows']) - set(rows))}")
+
+        if rows:
+            self.delete_rows(rows, values)
+
+        self.journal.remove(job)
+
+
+class CSVSource(Source):
+    """A queue in a CSV file, moving winners to another CSV file.
+
+    Imports start whenever the file's modification time or size changes.
+    The queue is rewritten whole and swapped in, and only if nothing else
+    wrote to it in the meantime.
+    """
+
+    def queue_file(self):
+        return path.join(self.dir, self.s_config["file"])
+
+    def history_file(self):
+        return path.join(self.dir, self.s_move["file"])
+
+    def reset(self, changed):
+        self.version = None
+
+    def changed(self):
+        # Nothing to compare with until the first import is in
+        if self.version is None:
+            return False
+        try:
+            return self.modified() != self.version
+        except OSError:
+            return False
+
+    def modified(self):
+        stat = os.stat(self.queue_file())
+        return f"{stat.st_mtime_ns}/{stat.st_size}"
+
+    def read(self):
+        with open(self.queue_file(), newline="", encoding="utf-8-sig") as f:
+            return list(csv.reader(f))
+
+    def read_block(self, left_col, right_col, start_row, max_row):
+        with metrics.timer("csv.read"):
+            rows = self.read()
+        return [row[left_col-1:right_col]
+            for row in rows[start_row-1:max_row]], None
+
+    def read_rows(self, rows, queue=None):
+        first = col_to_int(self.s_config["first_column"])
+        last = col_to_int(self.s_config["last_column"])
+        queue = self.read() if queue is None else queue
+        return [trim(queue[row-1][first-1:last]) if row <= len(queue) else []
+            for row in rows]
+
+    def append_rows(self, rows):
+        file = self.history_file()
+        pad = [""] * (col_to_int(self.s_move["column"]) - 1)
+
+        # Start on a new line if the last one wasn't finished. Checked as
+        # bytes, text mode can't seek into the middle of a character
+        newline = ""
+        if path.exists(file) and os.path.getsize(file):
+            with open(file, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) not in b"\r\n":
+                    newline = "\r\n"
+
+        with open(file, "a", newline="", encoding="utf-8") as f:
+            f.write(newline)
+            csv.writer(f).writerows(pad + row for row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def delete_rows(self, rows, values):
+        file = self.queue_file()
+        for attempt in range(5):
+            before = self.modified()
+            queue = self.read()
+
+            # Leave any row that's changed since it was read
+            current = self.read_rows(rows, queue)
+            delete = {row for row, old, new in zip(rows, values, current)
+                if new == old}
+            if len(delete) != len(rows):
+                print(f"Rows changed since move started, not deleting "
+                    f"{sorted(set(rows) - delete)}")
+
+            text = io.StringIO()
+            csv.writer(text, lineterminator="\n").writerows(row for i, row in
+                enumerate(queue, start=1) if i not in delete)
+
+            # Start over if something else wrote to the queue meanwhile
+            if write_atomic(file, text.getvalue(),
+                check=lambda: self.modified() == before):
+                return
+
+        raise RuntimeError(f"{file} kept changing, couldn't move rows")
+
+
+class SQLiteSource(Source):
+    """A queue in a SQLite table, moving winners to another table.
+
+    Tables are read in rowid order, so row 1 is the oldest row and column
+    A the first column of the table. Imports start whenever another
+    connection commits, and each move happens in a single transaction.
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.poll_db = None
+        self.data_version = None
+
+    def connect(self, timeout=10):
+        # Autocommit, transactions are begun by hand. Read-write rather than
+        # creating an empty database if the file's missing
+        file = pathname2url(path.abspath(path.join(self.dir, self.s_config["file"])))
+        return sqlite3.connect(f"file:{file}?mode=rw", uri=True,
+            timeout=timeout, isolation_level=None)
+
+    def reset(self, changed):
+        if self.poll_db:
+            self.poll_db.close()
+        self.poll_db = None
+        self.data_version = None
+
+    def changed(self):
+        # data_version changes when any other connection commits, and
+        # costs no more than a query to check. Runs on the render thread, so
+        # it doesn't wait for another connection's lock, a busy database
+        # just counts as unchanged until the next check
+        try:
+            if not self.poll_db:
+                self.poll_db = self.connect(timeout=0)
+            version = self.poll_db.execute("PRAGMA data_version").fetchone()[0]
+
+            if self.data_version is None:
+                # Nothing to compare with yet, fall back on the files for
+                # anything written since the last import
+                changed = (self.version is not None
+                    and self.modified() != self.version)
+            else:
+                changed = version != self.data_version
+        except (sqlite3.Error, OSError):
+            return False
+
+        self.data_version = version
+        return changed
+
+    def modified(self):
+        # Writes may sit in the WAL file until a checkpoint
+        file = path.join(self.dir, self.s_config["file"])
+        stats = [os.stat(f) for f in (file, file + "-wal") if path.exists(f)]
+        return "/".join(f"{s.st_mtime_ns}:{s.st_size}" for s in stats)
+
+    def table(self, name):
+        return '"' + name.replace('"', '""') + '"'
+
+    def rowids(self, db, rows):
+        # Row numbers are positions in rowid order, like rows on a sheet
+        queue = self.table(self.s_config["sheet"])
+        ids = [r[0] for r in db.execute(
+            f"SELECT rowid FROM {queue} ORDER BY rowid")]
+        return [ids[row-1] if row <= len(ids) else None for row in rows]
+
+    def read_block(self, left_col, right_col, start_row, max_row):
+        queue = self.table(self.s_config["sheet"])
+        db = self.connect()
+        try:
+            with metrics.timer("sqlite.read"):
+                rows = db.execute(
+                    f"SELECT rowid, * FROM {queue} ORDER BY rowid "
+                    "LIMIT ? OFFSET ?",
+                    (max_row - start_row + 1, start_row - 1)).fetchall()
+        finally:
+            db.close()
+
+        # Known by rowid, and what the row held in case the rowid is reused
+        block = [["" if v is None else str(v) for v in row[left_col:right_col+1]]
+            for row in rows]
+        return block, [[row[0], digest(self.values(row[1:]))] for row in rows]
+
+    def values(self, row):
+        first = col_to_int(self.s_config["first_column"])
+        last = col_to_int(self.s_config["last_column"])
+        return trim("" if v is None else str(v) for v in row[first-1:last])
+
+    def read_row(self, db, rowid):
+        # None if the row's gone
+        row = db.execute(f"SELECT * FROM {self.table(self.s_config['sheet'])} "
+            "WHERE rowid = ?", (rowid,)).fetchone()
+        return self.values(row) if row else None
+
+    def read_rows(self, rows, db=None):
+        if db is None:
+            db = self.connect()
+            try:
+                return self.read_rows(rows, db)
+            finally:
+                db.close()
+
+        return [self.read_row(db, rowid) or [] if rowid is not None else []
+            for rowid in self.rowids(db, rows)]
+
+    def run_move(self, job):
+        """Move a journalled winner's rows to the history table.
+
+        Rows are found by the rowid they had when imported, wherever they
+        are in the table now. Checking, appending and deleting happen in
+        one transaction, so the move happens whole or not at all.
+        """
+        history = self.table(self.s_move["sheet"])
+        queue = self.table(self.s_config["sheet"])
+
+        db = self.connect()
+        try:
+            with metrics.timer("sqlite.move"):
+                # Take the write lock up front so nothing changes under us
+                db.execute("BEGIN IMMEDIATE")
+
+                ids = job.get("ids") or [None] * len(job["rows"])
+                if None in ids:
+                    # Journalled without ids, go by position instead
+                    positions = self.rowids(db, job["rows"])
+                    expected = ([digest(values) for values in job["values"]]
+                        if job["values"] else [None] * len(job["rows"]))
+                    ids = [row_id or [rowid, values] for row_id, rowid, values
+                        in zip(ids, positions, expected)]
+
+                moved, refused = [], []
+                for row, (rowid, expected) in zip(job["rows"], ids):
+                    values = (self.read_row(db, rowid)
+                        if rowid is not None else None)
+                    if values and expected in (None, digest(values)):
+                        moved.append((rowid, values))
+                    else:
+                        refused.append(row)
+                if refused:
+                    print(f"Rows changed since import, not moving {refused}")
+
+                if not job["appended"] and moved:
+                    columns = [c[1] for c in
+                        db.execute(f"PRAGMA table_info({history})")]
+                    start = col_to_int(self.s_move["column"]) - 1
+                    for row in self.history_rows(job, [v for _, v in moved]):
+                        if start + len(row) > len(columns):
+                            raise ValueError(f"{self.s_move['sheet']} needs "
+                                f"{start + len(row)} columns to move into")
+                        names = ", ".join(self.table(c)
+                            for c in columns[start:start + len(row)])
+                        db.execute(f"INSERT INTO {history} ({names}) VALUES "
+                            f"({', '.join('?' * len(row))})", row)
+
+                db.executemany(f"DELETE FROM {queue} WHERE rowid = ?",
+                    [(rowid,) for rowid, _ in moved])
+                db.execute("COMMIT")
+        except BaseException:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+        self.journal.remove(job)
@@ -0,0 +1,114 @@
+import heapq
+import random
+from bisect import bisect_right
+
+
+class Spin:
+    """A whole spin worked out before it starts.
+
+    velocities holds how far the wheel turns on each physics tick, so
+    playing it back is just stepping through the list. Given the wheel's
+    layout and starting angle the final angle, winner and every wedge
+    boundary crossing are known up front.
+    """
+
+    def __init__(self, velocities, seed=None):
+        self.velocities = velocities
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.velocities)
+
+    def angles(self, start):
+        # Accumulated the same way Wheel.rotate does, so the floats match
+        angles = [start]
+        for velocity in self.velocities:
+            angles.append((angles[-1] + velocity) % 360)
+        return angles
+
+    def final_angle(self, start):
+        return self.angles(start)[-1]
+
+    def winner(self, start_angles, start):
+        if not start_angles:
+            return None
+        return bisect_right(start_angles, self.final_angle(start)) - 1
+
+    def crossings(self, start_angles, start):
+        """Yield the boundaries passed on each tick.
+
+        Each tick gives the fraction of the tick at which every boundary
+        in it was crossed, e.g. [], [0.2, 0.9], ...
+        """
+        angle = start
+        for velocity in self.velocities:
+            times = []
+            if start_angles and velocity > 0:
+                # Boundaries in (angle, angle + velocity], unwrapped
+                turns, offset = 0, bisect_right(start_angles, angle)
+                while True:
+                    if offset == len(start_angles):
+                        turns, offset = turns + 1, 0
+                    boundary = start_angles[offset] + turns * 360 - angle
+                    if boundary > velocity:
+                        break
+                    times.append(boundary / velocity)
+                    offset += 1
+            yield times
+            angle = (angle + velocity) % 360
+
+
+def roll(rng, bounds):
+    # Settings are rolled to two decimal places
+    return rng.randint(round(bounds[0] * 100), round(bounds[1] * 100)) / 100
+
+
+def plan_spin(seed, speed_range, decel_rate, decel_change=False,
+    max_ticks=10**6):
+    """Run the spin physics for a seed and return the resulting Spin."""
+    rng = random.Random(seed)
+    velocity = roll(rng, speed_range)
+    decel = roll(rng, decel_rate)
+
+    next_decel = None
+    if decel_change:
+        next_decel = lambda: roll(rng, decel_rate)
+
+    return Spin(spin_velocities(velocity, decel, next_decel, max_ticks), seed)
+
+
+def spin_velocities(velocity, decel, next_decel=None, max_ticks=10**6):
+    """The velocity on each tick of a spin, until it comes to rest.
+
+    next_decel re-rolls the deceleration every tick if given. max_ticks
+    stops a decel_rate of 0 from spinning forever.
+    """
+    velocities = []
+    while velocity >= 0 and len(velocities) < max_ticks:
+        velocities.append(velocity)
+
+        # Crawl to a stop rather than decaying forever
+        if velocity < 0.003:
+            velocity -= 0.003
+        else:
+            if next_decel:
+                decel = next_decel()
+            velocity -= velocity * (decel / 100)
+
+    return velocities
+
+
+def draw(weights, count, seed=None):
+    """Pick up to count indices, weighted and without replacement.
+
+    Gives the same odds, in the same order, as spinning for one winner at
+    a time and removing each before the next (Efraimidis-Spirakis).
+    """
+    rng = random.Random(seed)
+    keys = ((rng.random() ** (1 / weight), i)
+        for i, weight in enumerate(weights) if weight > 0)
+    return [i for _, i in heapq.nlargest(count, keys)]
+
+
+def new_seed():
+    return random.SystemRandom().randrange(2**32)
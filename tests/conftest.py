@@ -0,0 +1,5 @@
+import sys
+from os import path
+
+# The modules sit at the top of the repo rather than in a package
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
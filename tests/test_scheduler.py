@@ -0,0 +1,66 @@
+import pytest
+import requests
+
+import scheduler
+from scheduler import Scheduler, quota_bucket
+
+
+class Clock:
+    """Stands in for the time module, sleeping just moves it on.
+
+    Like a real sleep, it always takes some time, however little is asked.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 1e-6)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(scheduler, "time", clock)
+    return clock
+
+
+def test_bucket_stays_under_quota(clock):
+    bucket = quota_bucket(60)
+    times = []
+    for _ in range(300):
+        bucket.acquire()
+        times.append(clock.now)
+
+    # However the minute lines up, even including the opening burst
+    for i, start in enumerate(times):
+        assert sum(start <= t < start + 60 for t in times[i:]) <= 60
+
+
+def test_retries_stop_at_timeout(clock):
+    calls = []
+    def hang():
+        calls.append(clock.now)
+        clock.sleep(8)
+        raise requests.exceptions.Timeout()
+
+    with pytest.raises(requests.exceptions.Timeout):
+        Scheduler(retries=5, backoff=1.0, timeout=10).read("hang", hang)
+
+    # A second try fits in the timeout, a third wouldn't
+    assert len(calls) == 2
+
+
+def test_retries_without_timeout(clock):
+    calls = []
+    def fail():
+        calls.append(clock.now)
+        raise requests.exceptions.ConnectionError()
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        Scheduler(retries=3).write("fail", fail)
+
+    assert len(calls) == 4
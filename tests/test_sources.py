@@ -0,0 +1,286 @@
+import csv
+import sqlite3
+import time
+
+import pytest
+
+from scheduler import Journal
+from sources import CSVSource, Source, SQLiteSource
+
+
+def make_settings(tmp_path, **spreadsheet):
+    settings = {
+        "dir": str(tmp_path),
+        "spreadsheet": {"source": "", "file": "", "sheet": "queue",
+            "first_column": "A", "last_column": "B", "start_row": 1,
+            "max_rows": 100, "primary_column": "A", "key_column": "A",
+            "sub_column": "", "extra_columns": []},
+        "wheel": {"remove_dupes": False, "combine_dupes": False,
+            "combine_subs": False, "interleave": False},
+        "move": {"file": "", "sheet": "history", "column": "A", "row": 1,
+            "prepend_date": True},
+    }
+    settings["spreadsheet"].update(spreadsheet)
+    return settings
+
+
+def make_job(model, name, reason="win"):
+    i = model.names.index(name)
+    return {"id": name, "rows": model.get_rows(i), "ids": model.get_ids(i),
+        "reason": reason, "date": "D", "values": None, "appended": False}
+
+
+class ListSource(Source):
+    """A queue and history held in lists, failing when told to."""
+
+    def __init__(self, settings, rows):
+        super().__init__(settings)
+        self.rows = rows
+        self.history = []
+        self.fail = set()
+
+    def modified(self):
+        return len(self.rows)
+
+    def read_block(self, left_col, right_col, start_row, max_row):
+        return [row[left_col-1:right_col]
+            for row in self.rows[start_row-1:max_row]], None
+
+    def read_rows(self, rows):
+        return [self.rows[row-1] if row <= len(self.rows) else []
+            for row in rows]
+
+    def append_rows(self, rows):
+        if "append" in self.fail:
+            raise ConnectionError("append")
+        self.history.extend(rows)
+
+    def delete_rows(self, rows, values):
+        if "delete" in self.fail:
+            raise ConnectionError("delete")
+        for row in sorted(rows, reverse=True):
+            del self.rows[row-1]
+
+
+def test_run_move(tmp_path):
+    source = ListSource(make_settings(tmp_path), [["alice", "1"], ["bob", "2"]])
+    job = make_job(source.read_spreadsheet(), "bob")
+    source.journal.update(job)
+
+    source.run_move(job)
+
+    assert source.history == [["D", "bob", "2", "win"]]
+    assert source.rows == [["alice", "1"]]
+    assert source.journal.pending() == []
+    assert not (tmp_path / "moves.json").exists()
+
+
+def test_replay_after_failed_delete(tmp_path):
+    settings = make_settings(tmp_path)
+    source = ListSource(settings, [["alice", "1"], ["bob", "2"]])
+    job = make_job(source.read_spreadsheet(), "alice")
+    source.journal.update(job)
+
+    source.fail.add("delete")
+    with pytest.raises(ConnectionError):
+        source.run_move(job)
+
+    # Picked up from disk on the next start, past the append
+    [pending] = Journal(str(tmp_path / "moves.json")).pending()
+    assert pending["appended"] and pending["values"] == [["alice", "1"]]
+
+    restarted = ListSource(settings, source.rows)
+    restarted.run_move(pending)
+
+    assert source.history == [["D", "alice", "1", "win"]]
+    assert restarted.history == []
+    assert restarted.rows == [["bob", "2"]]
+    assert restarted.journal.pending() == []
+
+
+def test_replay_leaves_rows_changed_since(tmp_path):
+    source = ListSource(make_settings(tmp_path), [["alice", "1"], ["bob", "2"]])
+    job = make_job(source.read_spreadsheet(), "alice")
+    source.journal.update(job)
+    source.fail.add("delete")
+    with pytest.raises(ConnectionError):
+        source.run_move(job)
+
+    # Someone else removed alice meanwhile, bob mustn't go in her place
+    source.rows.pop(0)
+    source.fail.clear()
+    source.run_move(source.journal.pending()[0])
+
+    assert source.rows == [["bob", "2"]]
+    assert source.journal.pending() == []
+
+
+def test_refuses_rows_changed_since_import(tmp_path):
+    source = ListSource(make_settings(tmp_path), [["alice", "1"], ["bob", "2"]])
+    job = make_job(source.read_spreadsheet(), "bob")
+    source.rows[1] = ["carol", "3"]
+
+    source.run_move(job)
+
+    assert source.history == []
+    assert source.rows == [["alice", "1"], ["carol", "3"]]
+    assert source.journal.pending() == []
+
+
+def write_csv(file, rows):
+    with open(file, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+def read_csv(file):
+    with open(file, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+@pytest.fixture
+def csv_source(tmp_path):
+    write_csv(tmp_path / "queue.csv",
+        [["alice", "1"], ["bob", "2"], ["carol", "3"]])
+    settings = make_settings(tmp_path, source="csv", file="queue.csv")
+    settings["move"]["file"] = "history.csv"
+    return CSVSource(settings)
+
+
+def test_csv_move(csv_source, tmp_path):
+    model = csv_source.refresh_spreadsheet()
+    csv_source.run_move(make_job(model, "bob"))
+
+    assert read_csv(tmp_path / "queue.csv") == [["alice", "1"], ["carol", "3"]]
+    assert read_csv(tmp_path / "history.csv") == [["D", "bob", "2", "win"]]
+
+
+def test_csv_refuses_shifted_rows(csv_source, tmp_path):
+    model = csv_source.refresh_spreadsheet()
+    write_csv(tmp_path / "queue.csv", [["bob", "2"], ["carol", "3"]])
+
+    csv_source.run_move(make_job(model, "carol"))
+    csv_source.run_move(make_job(model, "bob"))
+
+    assert read_csv(tmp_path / "queue.csv") == [["bob", "2"], ["carol", "3"]]
+    assert not (tmp_path / "history.csv").exists()
+
+
+def test_csv_history_ending_mid_line(csv_source, tmp_path):
+    # Last line unfinished and ending in a multi-byte character
+    (tmp_path / "history.csv").write_text("x,naïve é", encoding="utf-8")
+    csv_source.append_rows([["bob", "2"]])
+
+    assert read_csv(tmp_path / "history.csv") == [["x", "naïve é"],
+        ["bob", "2"]]
+
+
+def test_csv_changed(csv_source, tmp_path):
+    assert not csv_source.changed()
+    csv_source.refresh_spreadsheet()
+    assert not csv_source.changed()
+
+    with open(tmp_path / "queue.csv", "a", newline="") as f:
+        csv.writer(f).writerow(["dave", "4"])
+    assert csv_source.changed()
+
+
+@pytest.fixture
+def sqlite_source(tmp_path):
+    db = sqlite3.connect(tmp_path / "queue.db")
+    db.execute("CREATE TABLE queue (name, number)")
+    db.execute("CREATE TABLE history (date, name, number, reason)")
+    db.executemany("INSERT INTO queue VALUES (?, ?)",
+        [("alice", 1), ("bob", 2), ("carol", 3)])
+    db.commit()
+    db.close()
+    return SQLiteSource(make_settings(tmp_path, source="sqlite",
+        file="queue.db"))
+
+
+def query(tmp_path, sql):
+    db = sqlite3.connect(tmp_path / "queue.db")
+    try:
+        rows = db.execute(sql).fetchall()
+        db.commit()
+        return rows
+    finally:
+        db.close()
+
+
+def test_sqlite_move(sqlite_source, tmp_path):
+    model = sqlite_source.refresh_spreadsheet()
+    sqlite_source.run_move(make_job(model, "bob"))
+
+    assert query(tmp_path, "SELECT * FROM queue") == [("alice", 1),
+        ("carol", 3)]
+    assert query(tmp_path, "SELECT * FROM history") == [
+        ("D", "bob", "2", "win")]
+
+
+def test_sqlite_moves_shifted_rows_by_rowid(sqlite_source, tmp_path):
+    model = sqlite_source.refresh_spreadsheet()
+    query(tmp_path, "DELETE FROM queue WHERE name = 'alice'")
+
+    sqlite_source.run_move(make_job(model, "carol"))
+    sqlite_source.run_move(make_job(model, "bob"))
+
+    assert query(tmp_path, "SELECT * FROM queue") == []
+    assert query(tmp_path, "SELECT name FROM history") == [("carol",),
+        ("bob",)]
+
+
+def test_sqlite_refuses_deleted_rows(sqlite_source, tmp_path):
+    model = sqlite_source.refresh_spreadsheet()
+    query(tmp_path, "DELETE FROM queue WHERE name = 'carol'")
+    # Takes carol's rowid
+    query(tmp_path, "INSERT INTO queue VALUES ('dave', 4)")
+
+    job = make_job(model, "carol")
+    sqlite_source.journal.update(job)
+    sqlite_source.run_move(job)
+
+    assert query(tmp_path, "SELECT * FROM history") == []
+    assert len(query(tmp_path, "SELECT * FROM queue")) == 3
+    assert sqlite_source.journal.pending() == []
+
+
+def test_sqlite_move_is_all_or_nothing(sqlite_source, tmp_path):
+    model = sqlite_source.refresh_spreadsheet()
+    # More columns than the history table has
+    sqlite_source.s_move["column"] = "C"
+    job = make_job(model, "bob")
+    sqlite_source.journal.update(job)
+
+    with pytest.raises(ValueError):
+        sqlite_source.run_move(job)
+
+    assert len(query(tmp_path, "SELECT * FROM queue")) == 3
+    assert query(tmp_path, "SELECT * FROM history") == []
+    assert sqlite_source.journal.pending() != []
+
+
+def test_sqlite_changed(sqlite_source, tmp_path):
+    sqlite_source.refresh_spreadsheet()
+    assert not sqlite_source.changed()
+    assert not sqlite_source.changed()
+
+    query(tmp_path, "DELETE FROM queue WHERE name = 'alice'")
+    assert sqlite_source.changed()
+    assert not sqlite_source.changed()
+
+
+def test_sqlite_changed_while_locked(sqlite_source, tmp_path):
+    sqlite_source.refresh_spreadsheet()
+    assert not sqlite_source.changed()
+
+    db = sqlite3.connect(tmp_path / "queue.db", isolation_level=None)
+    db.execute("BEGIN EXCLUSIVE")
+    db.execute("DELETE FROM queue WHERE name = 'alice'")
+    # Doesn't wait for the lock
+    start = time.monotonic()
+    assert not sqlite_source.changed()
+    assert time.monotonic() - start < 1
+
+    db.execute("COMMIT")
+    db.close()
+    assert sqlite_source.changed()
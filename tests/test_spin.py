@@ -0,0 +1,50 @@
+from collections import Counter
+
+from pytest import approx
+
+from spin import Spin, draw
+
+
+def test_draw_without_replacement():
+    picks = draw([1, 0, 2, 5], 10, seed=1)
+
+    assert sorted(picks) == [0, 2, 3]
+    assert draw([1, 0, 2, 5], 2, seed=1) == picks[:2]
+
+
+def test_draw_odds():
+    # First pick follows the weights, like a single spin
+    firsts = Counter(draw([1, 3], 1, seed=seed)[0] for seed in range(4000))
+
+    assert 0.72 < firsts[1] / 4000 < 0.78
+
+
+def test_crossings():
+    spin = Spin([100, 400, 0.5])
+    ticks = list(spin.crossings([0, 180], 10))
+
+    assert ticks == [[], approx([70 / 400, 250 / 400]), []]
+
+
+def test_crossings_wrap_into_same_wedge():
+    # Round past both boundaries and back into the starting wedge
+    spin = Spin([380])
+
+    assert list(spin.crossings([0, 180], 10)) == [
+        approx([170 / 380, 350 / 380])]
+
+
+def test_crossings_on_boundary():
+    # Landing exactly on a boundary crosses it, leaving one doesn't again
+    spin = Spin([170, 10])
+
+    assert list(spin.crossings([0, 180], 10)) == [[1.0], []]
+
+
+def test_winner():
+    spin = Spin([100, 400, 0.5])
+
+    assert spin.final_angle(10) == approx(150.5)
+    assert spin.winner([0, 180], 10) == 0
+    assert spin.winner([0, 90, 180, 270], 10) == 1
+    assert spin.winner([], 10) is None